@@ -1,6 +1,5 @@
 # app.py
 import streamlit as st
-from PIL import Image # Optional: To display an image/logo
 
 # --- Page Configuration (Sets defaults for all pages) ---
 # This should be the first Streamlit command in your script
@@ -30,6 +29,7 @@ st.markdown("---") # Visual separator
 
 # --- Optional: Logo/Image ---
 # try:
+#     from PIL import Image # Imported here, not at the top: app start-up should not pay for PIL
 #     # Make sure you have an image file (e.g., logo.png) in your project directory
 #     image_path = "logo.png" # Adjust path as needed
 #     image = Image.open(image_path)
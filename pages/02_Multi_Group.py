@@ -0,0 +1,163 @@
+# pages/02_Multi_Group.py
+import streamlit as st
+
+from src import config
+from src.data_loader import load_processed_data, load_group_index, load_selection_memo, page_column_manifest
+from src.versioning import dataset_version
+from src.plotting import plot_groups_bar_percentage, plot_groups_density_boxplot, chart_spec, render_chart
+from src.groups import build_group_frame, multi_group_display_labels
+from src.analysis import perform_multigroup_tests, calculate_summary_stats, format_test_results_html, grouped_stats
+from src import timing
+
+@st.cache_data
+def convert_df_to_csv(df_to_convert):
+   return df_to_convert.to_csv(index=False).encode('utf-8')
+
+# --- Timing (optional debug panel; the checkbox at the bottom of the sidebar sets this for the next rerun) ---
+timing.start_run(
+    "Multi-Group", record=config.TIMING_ENABLED or st.session_state.get("multigroup_timing_panel_v1", False),
+    reference=st.session_state.get("multigroup_ref_group_select_v1"),
+    comparisons=st.session_state.get("multigroup_comp_groups_select_v1"),
+    mutually_exclusive=st.session_state.get("multigroup_mutual_exclude_v1"),
+    variable=st.session_state.get("multigroup_variable_select_v1"),
+)
+
+try: # Every exit (including st.stop()) finishes the timing run, so the rerun is logged
+    # --- Page Config & Title ---
+    st.header("🧮 Multi-Group Comparison")
+    st.markdown("Compare one reference user group with several others at once.")
+    st.divider()
+
+    # --- Column Manifest (only these columns are read from the processed file) ---
+    PAGE_COLUMNS = page_column_manifest()
+
+    # --- Load Data ---
+    with timing.span('load_data'):
+        df_full = load_processed_data(PAGE_COLUMNS)
+        if df_full is None: st.stop()
+        group_index = load_group_index(dataset_version())
+
+    # --- SIDEBAR CONTROLS ---
+    st.sidebar.header("🧮 Multi-Group Controls")
+
+    ref_substance_name_display = st.sidebar.selectbox(
+        "1. Reference Group:",
+        options=config.SUBSTANCE_NAMES_SORTED,
+        index=config.SUBSTANCE_NAMES_SORTED.index(config.DEFAULT_REFERENCE_SUBSTANCE) if config.DEFAULT_REFERENCE_SUBSTANCE in config.SUBSTANCE_NAMES_SORTED else 0,
+        key="multigroup_ref_group_select_v1"
+    )
+
+    comp_options = [config.ALL_OTHER_RESPONDENTS] + [s for s in config.SUBSTANCE_NAMES_SORTED if s != ref_substance_name_display]
+    selected_comp_substance_names = st.sidebar.multiselect(
+        "2. Comparison Groups:",
+        options=comp_options,
+        default=[name for name in config.DEFAULT_MULTI_GROUP_COMPARISONS if name in comp_options],
+        key="multigroup_comp_groups_select_v1"
+    )
+
+    mutually_exclusive = st.sidebar.checkbox(
+        "Mutually Exclude Reference from Comparisons",
+        value=True,
+        key="multigroup_mutual_exclude_v1"
+    )
+
+    variable_label = st.sidebar.selectbox(
+        "3. Demographic Variable:",
+        options=list(config.DEMOGRAPHIC_COLS.keys()),
+        key="multigroup_variable_select_v1"
+    )
+    actual_col_name, col_type = config.DEMOGRAPHIC_COLS[variable_label]
+
+    selected_palette_name = st.sidebar.selectbox(
+        "4. Color Palette:",
+        options=list(config.PALETTES.keys()),
+        index=list(config.PALETTES.keys()).index(config.DEFAULT_MULTI_GROUP_PALETTE_NAME),
+        key="multigroup_palette_v1"
+    )
+    active_palette = config.PALETTES[selected_palette_name]
+
+    show_stats_tests = st.sidebar.checkbox("Show Significance Tests", value=False, key="multigroup_show_stats_v1")
+
+    # --- Define Groups ---
+    if ref_substance_name_display not in group_index: st.error("Invalid reference group."); st.stop()
+    if not selected_comp_substance_names: st.info("Please select at least one comparison group."); st.stop()
+    missing_groups = [name for name in selected_comp_substance_names if name != config.ALL_OTHER_RESPONDENTS and name not in group_index]
+    if missing_groups: st.warning(f"Cols for {', '.join(missing_groups)} not found."); st.stop()
+
+    selection_memo = load_selection_memo()
+    memo_key = (ref_substance_name_display, tuple(selected_comp_substance_names), mutually_exclusive, actual_col_name, dataset_version())
+    group_labels = multi_group_display_labels(ref_substance_name_display, selected_comp_substance_names, mutually_exclusive)
+
+    def build_groups():
+        # Every group's row positions from the GroupIndex, gathered into one narrow labeled frame
+        with timing.span('group_select'):
+            group_positions = group_index.select_many(ref_substance_name_display, selected_comp_substance_names, mutually_exclusive)
+        with timing.span('build_group_frame'):
+            df_groups = build_group_frame(
+                df_full, {group_labels[name]: positions for name, positions in group_positions.items()}, [actual_col_name], 'group_for_plot'
+            )
+        return {name: len(positions) for name, positions in group_positions.items()}, df_groups
+
+    group_sizes, df_groups = selection_memo.get('multi_groups', memo_key, build_groups)
+
+    st.sidebar.markdown("---")
+    st.sidebar.markdown("<br>".join(f"{group_labels[name]}: **{n}**" for name, n in group_sizes.items()), unsafe_allow_html=True)
+    st.sidebar.markdown("---")
+
+    groups_with_data = df_groups['group_for_plot'].value_counts()
+    groups_with_data = groups_with_data[groups_with_data > 0]
+    if len(groups_with_data) < 2:
+        st.warning(f"Insufficient data for '{variable_label}' to compare groups after NA removal.")
+    else:
+        # --- Main Content Area ---
+        label_list = list(group_labels.values())
+        st.subheader(f"Comparison: {ref_substance_name_display} vs. {len(label_list) - 1} group(s)")
+        st.caption(f"Comparing {len(label_list)} groups on **'{variable_label}'**: " + ", ".join(f"{label} ({group_sizes[name]})" for name, label in group_labels.items()) + ".")
+
+        def compute_stats():
+            # One grouped pass over the labeled frame gives every group's table row and box plot
+            with timing.span('summary_stats', source='live'):
+                grouped = grouped_stats(df_groups, actual_col_name, 'group_for_plot')
+                stats_dict = calculate_summary_stats(df_groups, actual_col_name, 'group_for_plot', grouped)
+                boxplot_stats = grouped.boxplot_frame('group_for_plot') if col_type == 'numerical' else None
+            return stats_dict, boxplot_stats
+
+        stats_dict, boxplot_stats = selection_memo.get('multi_stats', memo_key, compute_stats)
+
+        try:
+            if col_type == 'numerical':
+                chart = selection_memo.get('multi_chart', memo_key + (selected_palette_name,), lambda: chart_spec(
+                    plot_groups_density_boxplot(df_groups, actual_col_name, label_list, 'group_for_plot', active_palette, boxplot_stats=boxplot_stats)))
+            else:
+                chart = selection_memo.get('multi_chart', memo_key + (selected_palette_name,), lambda: chart_spec(
+                    plot_groups_bar_percentage(df_groups, actual_col_name, label_list, 'group_for_plot', active_palette)))
+            render_chart(chart)
+        except Exception as e:
+            st.error(f"Plotting Error for '{variable_label}':"); st.exception(e)
+
+        st.markdown("##### Summary Statistics")
+        st.dataframe(stats_dict['dataframe'], height=(min(12, len(stats_dict['dataframe'])) + 1) * 35 + 3, use_container_width=True)
+
+        st.divider()
+        if show_stats_tests:
+            st.markdown("##### Statistical Test")
+            test_results_str, p_val = selection_memo.get('multi_test', memo_key, lambda: perform_multigroup_tests(df_groups, actual_col_name, 'group_for_plot'))
+            st.markdown(format_test_results_html(test_results_str, p_val), unsafe_allow_html=True)
+        else:
+            st.caption("Enable 'Show Significance Tests' in sidebar.")
+
+        csv_data = selection_memo.get('multi_csv', memo_key, lambda: convert_df_to_csv(df_groups[[actual_col_name, 'group_for_plot']]))
+        st.download_button(
+            label=f"Download Filtered Data", data=csv_data,
+            file_name=f"multigroup_data_{ref_substance_name_display}_{actual_col_name}.csv",
+            mime='text/csv', key=f"multigroup_download_{actual_col_name}_v1"
+        )
+    st.divider()
+    st.caption("Note: If 'Mutually Exclude' is checked, comparison groups exclude users who also used the reference substance. "
+               "Comparison groups may still overlap each other, so the tests treat groups as independent samples only approximately.")
+
+    st.sidebar.checkbox("Show Timing Debug Panel", value=False, key="multigroup_timing_panel_v1")
+finally:
+    timing_run = timing.finish_run()
+if timing_run is not None and st.session_state.get("multigroup_timing_panel_v1"):
+    timing.render_debug_panel(timing_run)
@@ -1,42 +1,120 @@
 # src/analysis.py
+from dataclasses import dataclass
+
 import pandas as pd
 import numpy as np
-from scipy import stats
+
+from src import config # Use 'from src import config'
+from src.pairwise_tests import (chi2_from_counts, chi2_from_table, chi2_monte_carlo_from_counts, fisher_exact_from_counts,
+                                kruskal_from_counts, mannwhitneyu_from_counts, _median_from_counts)
+from src.timing import timed
 
 def _get_cleaned_col_name(col_name): # Ensure this helper is here
     return col_name.replace('q', 'Q').replace('_', ' ').replace('.', ' ').title()
 
-def calculate_summary_stats(df_to_summarize, col_name, group_col_for_stats):
-    summary_data = {}
-    cleaned_col_name_for_display = _get_cleaned_col_name(col_name)
 
-    if pd.api.types.is_numeric_dtype(df_to_summarize[col_name]):
-        grouped = df_to_summarize.groupby(group_col_for_stats)[col_name]
-        summary = grouped.agg(
-            N='count',
-            Mean='mean',
-            Median='median',
-            StdDev='std',
-            Min='min',
-            Q1=lambda x: x.quantile(0.25),
-            Q3=lambda x: x.quantile(0.75),
-            Max='max'
-        ).reset_index()
-        summary.rename(columns={group_col_for_stats: 'Group'}, inplace=True)
-        summary_data['type'] = 'numerical'
-        summary_data['dataframe'] = summary.round(2)
-        summary_data['title'] = f"Summary Statistics for '{cleaned_col_name_for_display}'"
-    else: # Categorical
-        counts_df = df_to_summarize.groupby(group_col_for_stats)[col_name].value_counts().rename('N').reset_index()
-        percent_df = df_to_summarize.groupby(group_col_for_stats)[col_name].value_counts(normalize=True).mul(100).rename('Percentage (%)').reset_index()
-        summary = pd.merge(counts_df, percent_df, on=[group_col_for_stats, col_name])
-        summary.rename(columns={group_col_for_stats: 'Group', col_name: 'Category'}, inplace=True)
-        summary['Percentage (%)'] = summary['Percentage (%)'].round(1).astype(str) + '%'
-        summary_data['type'] = 'categorical'
-        # Display N and Percentage for each category, grouped
-        summary_data['dataframe'] = summary.set_index(['Group', 'Category']).sort_index()
-        summary_data['title'] = f"Distribution for '{cleaned_col_name_for_display}'"
-    return summary_data
+# --- Grouped Statistics Kernel ---
+
+NUMERICAL_STATS = ['N', 'Mean', 'Median', 'StdDev', 'Min', 'Q1', 'Q3', 'Max']
+BOXPLOT_STATS = {'Min': 'min_val', 'Q1': 'q1', 'Median': 'median', 'Q3': 'q3', 'Max': 'max_val', 'N': 'count'}
+
+@dataclass(frozen=True)
+class GroupedStats:
+    """
+    Per-group statistics of one variable (see `grouped_stats`). `table` has one row per group: the
+    NUMERICAL_STATS for numeric variables, or the count of every category for categorical ones.
+    Feeds both the summary table and the box plots, so each is computed once per selection.
+    """
+    kind: str # 'numerical' or 'categorical'
+    table: pd.DataFrame
+
+    def summary_frame(self):
+        """The `calculate_summary_stats` table: rounded stats per group, or N and % per (group, category)."""
+        if self.kind == 'numerical':
+            return self.table.rename_axis('Group').reset_index().round(2)
+        counts = self.table
+        percentages = counts.div(counts.sum(axis=1), axis=0).mul(100).fillna(0.0) # Empty groups: 0%, as value_counts
+        summary = pd.DataFrame({
+            'N': counts.stack(future_stack=True).astype('int64'),
+            'Percentage (%)': percentages.stack(future_stack=True).round(1).astype(str) + '%',
+        }).rename_axis(['Group', 'Category'])
+        # value_counts lists every category of a categorical, but only observed values otherwise
+        return summary if isinstance(counts.columns, pd.CategoricalIndex) else summary[summary['N'] > 0]
+
+    def boxplot_frame(self, group_col):
+        """Box-plot quantiles (min_val, q1, median, q3, max_val, count) per group, as the box plots take them."""
+        return self.table[list(BOXPLOT_STATS)].rename(columns=BOXPLOT_STATS).rename_axis(group_col).reset_index()
+
+def _lerp(low, high, t):
+    """numpy's linear interpolation (as used by Series.quantile), bit for bit."""
+    return np.where(t >= 0.5, high - (high - low) * (1 - t), low + (high - low) * t)
+
+def _numerical_table(values, codes, groups, dtype):
+    """NUMERICAL_STATS per group from one sort of the values by (group, value)."""
+    valid = ~np.isnan(values)
+    values, codes = values[valid], codes[valid]
+    sorted_values = np.append(values[np.lexsort((values, codes))], np.nan) # Empty groups read the trailing NaN
+    n = np.bincount(codes, minlength=len(groups))
+    starts = np.cumsum(n) - n
+
+    def nth(k):
+        """The k-th smallest value of every group."""
+        return sorted_values[np.where(n > 0, starts + k, len(values))]
+
+    def quantile(q): # Linear interpolation between closest ranks, as Series.quantile
+        virtual = (n - 1) * q
+        lower = np.floor(virtual).astype(np.intp)
+        return _lerp(nth(lower), nth(np.minimum(lower + 1, n - 1)), virtual - lower)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(codes, weights=values, minlength=len(groups)) / n
+        squares = np.bincount(codes, weights=(values - mean[codes]) ** 2, minlength=len(groups))
+        std = np.where(n > 1, np.sqrt(squares / (n - 1)), np.nan)
+    table = pd.DataFrame({
+        'N': n.astype('int64'), 'Mean': mean, 'Median': (nth((n - 1) // 2) + nth(n // 2)) / 2, 'StdDev': std,
+        'Min': nth(0), 'Q1': quantile(0.25), 'Q3': quantile(0.75), 'Max': nth(n - 1),
+    }, index=groups)
+    if pd.api.types.is_integer_dtype(dtype) and (n > 0).all(): # Min/Max keep integer columns' type, as groupby does
+        table[['Min', 'Max']] = table[['Min', 'Max']].astype(dtype)
+    return table
+
+def _categorical_table(series, codes, groups):
+    """Group x category counts from one bincount; all categories of a categorical, else the observed ones sorted."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        category_codes, categories = series.cat.codes.to_numpy(), pd.CategoricalIndex(series.cat.categories, dtype=series.dtype)
+    else:
+        category_codes, categories = pd.factorize(series, sort=True)
+    valid = category_codes >= 0
+    counts = np.bincount(codes[valid] * len(categories) + category_codes[valid], minlength=len(groups) * len(categories))
+    return pd.DataFrame(counts.reshape(len(groups), len(categories)), index=groups, columns=categories)
+
+@timed()
+def grouped_stats(df, col_name, group_col):
+    """
+    One-pass grouped statistics of `col_name` by `group_col` (observed groups, in groupby order).
+    Numeric columns are sorted once by (group, value) and every statistic is read off the sorted
+    segments; anything else is counted per (group, category) with one bincount.
+    """
+    group_codes, groups = pd.factorize(df[group_col], sort=True)
+    groups = pd.Index(groups, name=None)
+    series = df[col_name]
+    valid_group = group_codes >= 0
+    if pd.api.types.is_numeric_dtype(series):
+        values = series.to_numpy(dtype='float64', na_value=np.nan)
+        return GroupedStats('numerical', _numerical_table(values[valid_group], group_codes[valid_group], groups, series.dtype))
+    return GroupedStats('categorical', _categorical_table(series[valid_group], group_codes[valid_group], groups))
+
+@timed()
+def calculate_summary_stats(df_to_summarize, col_name, group_col_for_stats, grouped=None):
+    """Summary table dict for `col_name` by group; pass `grouped` (from `grouped_stats`) to reuse it."""
+    if grouped is None:
+        grouped = grouped_stats(df_to_summarize, col_name, group_col_for_stats)
+    cleaned_col_name_for_display = _get_cleaned_col_name(col_name)
+    if grouped.kind == 'numerical':
+        title = f"Summary Statistics for '{cleaned_col_name_for_display}'"
+    else: # Display N and Percentage for each category, grouped
+        title = f"Distribution for '{cleaned_col_name_for_display}'"
+    return {'type': grouped.kind, 'dataframe': grouped.summary_frame(), 'title': title}
 
 
 def format_test_results_html(test_results_str, p_value_for_color=None):
@@ -61,7 +139,22 @@ def format_test_results_html(test_results_str, p_value_for_color=None):
     return f"<pre style='font-size: 0.85em; line-height: 1.4;'>{test_results_str}</pre>"
 
 
-def perform_comparison_tests(df_pair, col_name, ref_group_label, comp_group_label, group_col_for_plot):
+def _group_histograms(group1_data, group2_data):
+    """Both groups' value histograms over their shared sorted distinct values: (levels, counts1, counts2)."""
+    codes, levels = pd.factorize(pd.concat([group1_data, group2_data], ignore_index=True), sort=True)
+    n1 = len(group1_data)
+    return levels, np.bincount(codes[:n1], minlength=len(levels)), np.bincount(codes[n1:], minlength=len(levels))
+
+@timed()
+def perform_comparison_tests(df_pair, col_name, ref_group_label, comp_group_label, group_col_for_plot,
+                             n_resamples=config.MONTE_CARLO_RESAMPLES, seed=config.MONTE_CARLO_SEED):
+    """
+    Mann-Whitney U (numeric) or chi-squared (categorical) test of the two groups, computed from their
+    value histograms. When expected counts fall below 5, the result comes from Fisher's exact test
+    (2 x 2 tables) or a seeded Monte Carlo chi-squared test with `n_resamples` tables instead; the
+    asymptotic p-value stays in the text, and the Monte Carlo one is labelled as a resampled estimate
+    that cannot go below 1 / (n_resamples + 1). Returns (report text, p-value or None).
+    """
     results_list = [] # Store lines of text
     p_value_num = None # Store the numerical p-value for coloring
 
@@ -80,29 +173,109 @@ def perform_comparison_tests(df_pair, col_name, ref_group_label, comp_group_labe
         results_list.append("  Skipping test: Insufficient data in one or both groups (N < 3).")
         return "\n".join(results_list), None # Return None for p_value_num
 
+    levels, counts1, counts2 = _group_histograms(group1_data, group2_data)
     if pd.api.types.is_numeric_dtype(df_pair[col_name]):
         try:
             # Medians
-            median1, median2 = group1_data.median(), group2_data.median()
+            levels = np.asarray(levels, dtype='float64')
+            median1, median2 = _median_from_counts(levels, counts1), _median_from_counts(levels, counts2)
             results_list.append(f"  Medians: {median1:.1f} vs {median2:.1f}")
-            # Mann-Whitney U
-            stat, p_value_num = stats.mannwhitneyu(group1_data, group2_data, alternative='two-sided')
+            # Mann-Whitney U: from the histograms (tie-corrected normal approximation), or scipy's exact
+            # distribution where scipy would use it (a group of 8 or fewer and no ties)
+            if min(n1, n2) <= 8 and len(levels) == n1 + n2:
+                from scipy import stats # Only needed here; see src/pairwise_tests.py
+                stat, p_value_num = stats.mannwhitneyu(group1_data, group2_data, alternative='two-sided')
+            else:
+                stat, p_value_num, _n1, _n2 = mannwhitneyu_from_counts(counts1, counts2)
             results_list.append(f"  Mann-Whitney U: Test Stat={stat:.2f}, p-value={p_value_num:.4g}")
             results_list.append(f"  Result: {'Significant difference (p < 0.05)' if p_value_num < 0.05 else 'No significant difference (p >= 0.05)'}")
         except ValueError as e:
             results_list.append(f"  Mann-Whitney U test error: {e}")
     else: # Categorical
         try:
-            contingency_table = pd.crosstab(df_pair[group_col_for_plot], df_pair[col_name])
-            if contingency_table.shape[0] > 1 and contingency_table.shape[1] > 1:
-                chi2, p_value_num, dof, expected = stats.chi2_contingency(contingency_table)
-                results_list.append(f"  Chi-squared: Test Stat={chi2:.2f}, df={dof}, p-value={p_value_num:.4g}")
-                if (expected < 5).any().any():
-                     results_list.append("  Warning: Expected cell count < 5. Chi-squared may be unreliable.")
+            present = (counts1 + counts2) > 0
+            counts1, counts2 = counts1[present], counts2[present]
+            if len(counts1) > 1:
+                chi2, p_value_num, dof, min_expected, _n = (np.asarray(v).item() for v in chi2_from_counts(counts1, counts2))
+                results_list.append(f"  Chi-squared: Test Stat={chi2:.2f}, df={int(dof)}, p-value={p_value_num:.4g}")
+                if min_expected < 5: # Report an exact (2 x 2) or Monte Carlo p-value instead
+                    results_list.append("  Warning: Expected cell count < 5. Chi-squared may be unreliable.")
+                    if len(counts1) == 2:
+                        _odds_ratio, p_value_num = fisher_exact_from_counts(counts1, counts2)
+                        results_list.append(f"  Fisher's exact test: p-value={p_value_num:.4g}")
+                    else:
+                        _chi2, p_value_num = chi2_monte_carlo_from_counts(counts1, counts2, n_resamples, seed)
+                        line = f"  Monte Carlo chi-squared (resampled estimate, {n_resamples} tables): p-value={p_value_num:.4g}"
+                        if p_value_num <= 1 / (n_resamples + 1): # No resampled table was as extreme
+                            line += f" (resolution limit: p < {1 / (n_resamples + 1):.0e})"
+                        results_list.append(line)
                 results_list.append(f"  Result: {'Significant association (p < 0.05)' if p_value_num < 0.05 else 'No significant association (p >= 0.05)'}")
             else:
                  results_list.append("  Chi-squared: Contingency table too small (needs >= 2x2).")
         except ValueError as e:
             results_list.append(f"  Chi-squared test error: {e}")
 
-    return "\n".join(results_list), p_value_num
\ No newline at end of file
+    return "\n".join(results_list), p_value_num
+
+
+# --- Multi-Group Tests ---
+
+def grouped_histograms(df, col_name, group_col):
+    """
+    Value histogram of `col_name` for every group of `group_col` over their shared sorted distinct
+    values, from one factorize per column and one bincount: (groups, levels, groups x levels counts).
+    """
+    group_codes, groups = pd.factorize(df[group_col], sort=True)
+    value_codes, levels = pd.factorize(df[col_name], sort=True)
+    valid = (group_codes >= 0) & (value_codes >= 0)
+    counts = np.bincount(group_codes[valid] * len(levels) + value_codes[valid], minlength=len(groups) * len(levels))
+    return pd.Index(groups, name=None), levels, counts.reshape(len(groups), len(levels))
+
+@timed()
+def perform_multigroup_tests(df_groups, col_name, group_col_for_plot):
+    """
+    Kruskal-Wallis H (numeric) or k x m chi-squared (categorical) test across all groups of
+    `group_col_for_plot`, computed from every group's value histogram at once. Groups with fewer
+    than 3 values are left out of the test. Returns (report text, p-value or None).
+    """
+    results_list = [] # Store lines of text
+    p_value_num = None # Store the numerical p-value for coloring
+
+    groups, levels, counts = grouped_histograms(df_groups, col_name, group_col_for_plot)
+    n_per_group = counts.sum(axis=1)
+    results_list.append(f"Comparison: {' vs '.join(groups)}")
+    results_list.append(f"Variable: {_get_cleaned_col_name(col_name)}")
+    results_list.append("-" * 30)
+    results_list.append("N: " + ", ".join(f"{group}={n}" for group, n in zip(groups, n_per_group)))
+
+    tested = n_per_group >= 3 # Same threshold as the two-group tests
+    if not tested.all():
+        results_list.append("  Left out (N < 3): " + ", ".join(groups[~tested]))
+    if tested.sum() < 2:
+        results_list.append("  Skipping test: Fewer than two groups with sufficient data (N >= 3).")
+        return "\n".join(results_list), None
+    groups, counts = groups[tested], counts[tested]
+
+    if pd.api.types.is_numeric_dtype(df_groups[col_name]):
+        levels = np.asarray(levels, dtype='float64')
+        medians = _median_from_counts(levels, counts)
+        results_list.append("  Medians: " + ", ".join(f"{group}={median:.1f}" for group, median in zip(groups, medians)))
+        h_stat, p_value, dof = kruskal_from_counts(counts)
+        if np.isnan(h_stat):
+            results_list.append("  Kruskal-Wallis: All values are identical; no test possible.")
+        else:
+            p_value_num = float(p_value)
+            results_list.append(f"  Kruskal-Wallis H: Test Stat={h_stat:.2f}, df={dof}, p-value={p_value_num:.4g}")
+            results_list.append(f"  Result: {'Significant difference between groups (p < 0.05)' if p_value_num < 0.05 else 'No significant difference between groups (p >= 0.05)'}")
+    else: # Categorical
+        counts = counts[:, counts.sum(axis=0) > 0]
+        if counts.shape[1] > 1:
+            chi2, p_value_num, dof, min_expected, _n = (np.asarray(v).item() for v in chi2_from_table(counts))
+            results_list.append(f"  Chi-squared ({counts.shape[0]} x {counts.shape[1]}): Test Stat={chi2:.2f}, df={int(dof)}, p-value={p_value_num:.4g}")
+            if min_expected < 5:
+                results_list.append("  Warning: Expected cell count < 5. Chi-squared may be unreliable.")
+            results_list.append(f"  Result: {'Significant association (p < 0.05)' if p_value_num < 0.05 else 'No significant association (p >= 0.05)'}")
+        else:
+            results_list.append("  Chi-squared: Contingency table too small (needs >= 2 categories).")
+
+    return "\n".join(results_list), p_value_num
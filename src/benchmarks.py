@@ -0,0 +1,186 @@
+# src/benchmarks.py
+# Timing benchmarks of the app's data path on synthetic GPS-schema data (see src/synthetic.py) at
+# several multiples of the real respondent count. Each run writes one JSON file (environment + one
+# record per benchmark) plus a CSV copy of the records; --compare reports ratios against an older run.
+#
+#   python -m src.benchmarks --scales 1 10 100
+#   python -m src.benchmarks --compare benchmark_results/<previous run>.json
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from src import config # Use 'from src import config'
+from src.synthetic import BASE_N_ROWS, generate_processed_frame, to_raw_frame
+from src.versioning import dataset_version
+
+DEFAULT_SCALES = (1, 10)
+NUMERICAL_PLOTS = ('plot_density_boxplot', 'plot_overlapping_histogram_count', 'plot_side_by_side_boxplot')
+CATEGORICAL_PLOTS = ('plot_grouped_bar_percentage', 'plot_grouped_bar_count', 'plot_faceted_pie_charts')
+
+
+def _time(func, repeat):
+    """Runs `func` `repeat` times; returns (last result, list of wall-clock seconds)."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return result, timings
+
+def _record(benchmark, scale, n_rows, timings, variable=None, **extra):
+    return {
+        'benchmark': benchmark, 'scale': scale, 'n_rows': n_rows, 'variable': variable,
+        'repeats': len(timings), 'seconds_min': min(timings), 'seconds_median': float(np.median(timings)),
+        **extra,
+    }
+
+def _load_preprocessing():
+    """preprocessing.py runs as a script next to config.py (`import config`), so import it the same way."""
+    src_dir = os.path.join(config.PROJECT_ROOT, 'src')
+    if src_dir not in sys.path:
+        sys.path.insert(0, src_dir)
+    import preprocessing
+    return preprocessing
+
+def run_scale(scale, repeat=3, reference=config.DEFAULT_REFERENCE_SUBSTANCE,
+              comparison=config.DEFAULT_COMPARISON_SUBSTANCES[0], include_preprocessing=True):
+    """All benchmarks at one scale (a multiple of BASE_N_ROWS); returns a list of records."""
+    from src import data_loader, plotting, shared_data
+    from src.analysis import calculate_summary_stats, perform_comparison_tests
+    from src.groups import GroupIndex, build_comparison_frame, group_display_labels
+    from src.pairwise_tests import compute_pairwise_tests
+
+    n_rows = int(BASE_N_ROWS * scale)
+    records = []
+    df_generated = generate_processed_frame(n_rows)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # --- Loading ---
+        processed_path = os.path.join(tmp_dir, 'processed_data.parquet')
+        _load_preprocessing().compact_frame(df_generated).to_parquet(processed_path, index=False) # As preprocessing stores it
+        records.append({**_record('parquet_file_size', scale, n_rows, [0.0]), 'bytes': os.path.getsize(processed_path)})
+        original_path = config.PROCESSED_DATA_PATH
+        config.PROCESSED_DATA_PATH = processed_path
+        try:
+            # The undecorated functions, so every repeat really reads the file
+            manifest = data_loader.page_column_manifest()
+            version = dataset_version(processed_path)
+            df, timings = _time(lambda: data_loader._load_private_copy.__wrapped__(version, manifest), repeat)
+            records.append(_record('load_processed_data', scale, n_rows, timings))
+            _result, timings = _time(lambda: data_loader._load_private_copy.__wrapped__(version), repeat)
+            records.append(_record('load_processed_data_all_columns', scale, n_rows, timings))
+        finally:
+            config.PROCESSED_DATA_PATH = original_path
+
+        # --- Shared dataset: one export per version, then a memory map per process ---
+        arrow_path = shared_data.arrow_path('benchmark', tmp_dir)
+        _result, timings = _time(lambda: shared_data.export_arrow(processed_path, arrow_path), 1)
+        records.append({**_record('export_shared_dataset', scale, n_rows, timings), 'bytes': os.path.getsize(arrow_path)})
+        _result, timings = _time(lambda: shared_data.table_to_frame(shared_data.map_dataset(processed_path, 'benchmark', tmp_dir), manifest), repeat)
+        records.append(_record('load_shared_data', scale, n_rows, timings))
+
+        if include_preprocessing:
+            preprocessing = _load_preprocessing()
+            raw_path = os.path.join(tmp_dir, 'gps.csv')
+            to_raw_frame(df_generated).to_csv(raw_path, index=False, encoding='latin1')
+            records.append({**_record('raw_csv_file_size', scale, n_rows, [0.0]), 'bytes': os.path.getsize(raw_path)})
+            with contextlib.redirect_stdout(io.StringIO()): # preprocess_data reports progress verbosely
+                _result, timings = _time(lambda: preprocessing.preprocess_data(raw_path, os.path.join(tmp_dir, 'out.parquet')), repeat)
+            records.append(_record('preprocess_data', scale, n_rows, timings))
+
+    # --- Group selection ---
+    group_index, timings = _time(lambda: GroupIndex.from_frame(df), repeat)
+    records.append(_record('group_index', scale, n_rows, timings))
+    selection, timings = _time(lambda: group_index.select(reference, comparison, True), repeat)
+    records.append(_record('group_select', scale, n_rows, timings))
+    ref_label, comp_label = group_display_labels(reference, comparison, True)
+    palette = config.PALETTES[config.DEFAULT_PALETTE_NAME]
+
+    for col_name, col_type in config.DEMOGRAPHIC_COLS.values():
+        df_pair, timings = _time(lambda: build_comparison_frame(df, selection, [col_name], ref_label, comp_label), repeat)
+        records.append(_record('comparison_frame', scale, n_rows, timings, col_name))
+
+        # --- Statistics ---
+        _result, timings = _time(lambda: calculate_summary_stats(df_pair, col_name, 'group_for_plot'), repeat)
+        records.append(_record('calculate_summary_stats', scale, n_rows, timings, col_name))
+        _result, timings = _time(lambda: perform_comparison_tests(df_pair, col_name, ref_label, comp_label, 'group_for_plot'), repeat)
+        records.append(_record('perform_comparison_tests', scale, n_rows, timings, col_name))
+
+        # --- Plots: building the chart and serializing its Vega-Lite spec ---
+        for plot_name in (NUMERICAL_PLOTS if col_type == 'numerical' else CATEGORICAL_PLOTS):
+            plot_func = getattr(plotting, plot_name)
+            chart, timings = _time(lambda: plot_func(df_pair, col_name, ref_label, comp_label, 'group_for_plot', palette), repeat)
+            records.append(_record(plot_name, scale, n_rows, timings, col_name))
+            spec, timings = _time(chart.to_json, repeat)
+            records.append(_record(f'{plot_name}.to_json', scale, n_rows, timings, col_name, bytes=len(spec.encode())))
+
+    _result, timings = _time(lambda: compute_pairwise_tests(df, group_index=group_index), repeat)
+    records.append(_record('compute_pairwise_tests', scale, n_rows, timings))
+    return records
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=config.PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def write_results(records, output_dir):
+    """Writes `<timestamp>.json` (environment + records) and `<timestamp>.csv` (records) to `output_dir`."""
+    os.makedirs(output_dir, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    results = {
+        'created': stamp, 'git_revision': _git_revision(), 'python': platform.python_version(),
+        'platform': platform.platform(), 'cpu_count': os.cpu_count(),
+        'packages': {name: __import__(name).__version__ for name in ('pandas', 'numpy', 'scipy', 'pyarrow', 'altair')},
+        'records': records,
+    }
+    json_path = os.path.join(output_dir, f'{stamp}.json')
+    with open(json_path, 'w') as f:
+        json.dump(results, f, indent=1)
+    pd.DataFrame(records).to_csv(os.path.join(output_dir, f'{stamp}.csv'), index=False)
+    return json_path
+
+def compare_results(baseline_path, records, threshold=1.25):
+    """Median-time ratios (current / baseline) per benchmark; returns the rows slower than `threshold`."""
+    with open(baseline_path) as f:
+        baseline = pd.DataFrame(json.load(f)['records'])
+    keys = ['benchmark', 'scale', 'variable']
+    current = pd.DataFrame(records)
+    merged = current.merge(baseline, on=keys, how='inner', suffixes=('', '_baseline'))
+    merged = merged[merged['seconds_median_baseline'] > 0]
+    merged['ratio'] = merged['seconds_median'] / merged['seconds_median_baseline']
+    print(merged[keys + ['seconds_median_baseline', 'seconds_median', 'ratio']].to_string(index=False, float_format='{:.4g}'.format))
+    return merged[merged['ratio'] > threshold]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark loading, group selection, statistics and plots on synthetic data.")
+    parser.add_argument("--scales", type=float, nargs="+", default=list(DEFAULT_SCALES),
+                        help=f"Multiples of the real respondent count ({BASE_N_ROWS})")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed repetitions per benchmark")
+    parser.add_argument("--no-preprocessing", action="store_true", help="Skip the raw CSV preprocessing benchmark")
+    parser.add_argument("--output-dir", default=config.BENCHMARK_RESULTS_DIR)
+    parser.add_argument("--compare", help="Earlier results JSON to compare median timings against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Slowdown ratio reported as a regression by --compare")
+    args = parser.parse_args()
+
+    records = []
+    for scale in args.scales:
+        print(f"Benchmarking scale {scale:g} ({int(BASE_N_ROWS * scale)} respondents)...")
+        records += run_scale(scale, args.repeat, include_preprocessing=not args.no_preprocessing)
+    print(f"Results written to {write_results(records, args.output_dir)}")
+    if args.compare:
+        regressions = compare_results(args.compare, records, args.threshold)
+        if not regressions.empty:
+            print(f"{len(regressions)} benchmarks are more than {args.threshold:g}x slower than {args.compare}")
+            sys.exit(1)
@@ -0,0 +1,103 @@
+# src/bootstrap.py
+# Percentile bootstrap confidence intervals for the two groups of a comparison frame. Each group is
+# histogrammed once over the distinct values; a resample (n draws with replacement) is then exactly a
+# multinomial draw of counts over those values, so all resamples form one resamples x values count
+# matrix and every statistic is computed for all of them at once. Resamples are drawn in fixed-size
+# blocks with their own child seeds, run on threads for large jobs: results depend only on the seed.
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src import config # Use 'from src import config'
+from src.analysis import _group_histograms, _lerp
+from src.timing import timed
+
+BLOCK_RESAMPLES = 500 # Resamples per block (and child seed); fixed so results do not depend on the worker count
+PARALLEL_MIN_CELLS = 2_000_000 # Resamples x distinct values from which blocks are drawn on several threads
+
+
+def _resample_counts(counts, n_resamples, seed_sequence, workers):
+    """`n_resamples` x V bootstrap resamples of the histogram `counts`, as multinomial counts."""
+    n = int(counts.sum())
+    probabilities = counts / n
+    sizes = [min(BLOCK_RESAMPLES, n_resamples - start) for start in range(0, n_resamples, BLOCK_RESAMPLES)]
+    seeds = seed_sequence.spawn(len(sizes))
+
+    def draw(seed, size): # numpy Generators release the GIL while drawing
+        return np.random.default_rng(seed).multinomial(n, probabilities, size=size)
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(sizes) > 1 and n_resamples * len(counts) >= PARALLEL_MIN_CELLS:
+        with ThreadPoolExecutor(min(workers, len(sizes))) as executor:
+            return np.concatenate(list(executor.map(draw, seeds, sizes)))
+    return np.concatenate([draw(seed, size) for seed, size in zip(seeds, sizes)])
+
+def _quantile_from_counts(levels, counts, q):
+    """Series.quantile(q) (linear interpolation) of histograms along the last axis."""
+    n = counts.sum(axis=-1)
+    cum = np.cumsum(counts, axis=-1)
+    virtual = (n - 1) * q
+    lower = np.floor(virtual)
+    low = levels[np.argmax(cum > lower[..., None], axis=-1)]
+    high = levels[np.argmax(cum > np.minimum(lower + 1, n - 1)[..., None], axis=-1)]
+    return _lerp(low, high, virtual - lower)
+
+def _numerical_stats(levels, counts, center):
+    """{statistic: values} of histograms along the last axis; `center` keeps the variance numerically stable."""
+    n = counts.sum(axis=-1)
+    deviations = levels - center
+    mean_deviation = counts @ deviations / n
+    variance = (counts @ deviations ** 2 - n * mean_deviation ** 2) / (n - 1)
+    return {
+        'Mean': center + mean_deviation,
+        'Median': _quantile_from_counts(levels, counts, 0.5),
+        'StdDev': np.sqrt(np.maximum(variance, 0)),
+        'Q1': _quantile_from_counts(levels, counts, 0.25),
+        'Q3': _quantile_from_counts(levels, counts, 0.75),
+    }
+
+def _categorical_stats(levels, counts):
+    """{'% category': values} of histograms along the last axis."""
+    percentages = counts / counts.sum(axis=-1, keepdims=True) * 100
+    return {f"% {level}": percentages[..., i] for i, level in enumerate(levels)}
+
+@timed()
+def bootstrap_confidence_intervals(df_pair, col_name, ref_group_label, comp_group_label, group_col_for_plot,
+                                   n_resamples=config.BOOTSTRAP_RESAMPLES, confidence=config.BOOTSTRAP_CONFIDENCE,
+                                   seed=config.BOOTSTRAP_SEED, workers=config.BOOTSTRAP_WORKERS):
+    """
+    Estimates with percentile bootstrap CIs for both groups and their difference (reference minus
+    comparison): mean, median, standard deviation and quartiles of numeric variables, or the percentage
+    of each category. Returns a frame with Group, Statistic, Estimate, CI Lower and CI Upper columns
+    (None if either group is empty). `workers=0` uses every core.
+    """
+    group1_data = df_pair[df_pair[group_col_for_plot] == ref_group_label][col_name].dropna()
+    group2_data = df_pair[df_pair[group_col_for_plot] == comp_group_label][col_name].dropna()
+    if group1_data.empty or group2_data.empty:
+        return None
+    levels, counts1, counts2 = _group_histograms(group1_data, group2_data)
+
+    if pd.api.types.is_numeric_dtype(df_pair[col_name]):
+        levels = np.asarray(levels, dtype='float64')
+        center = float(np.concatenate([group1_data, group2_data]).mean())
+        statistics = lambda counts: _numerical_stats(levels, counts, center)
+    else:
+        statistics = lambda counts: _categorical_stats(levels, counts)
+
+    seed1, seed2 = np.random.SeedSequence(seed).spawn(2)
+    estimates = {ref_group_label: statistics(counts1), comp_group_label: statistics(counts2)}
+    resampled = {ref_group_label: statistics(_resample_counts(counts1, n_resamples, seed1, workers)),
+                 comp_group_label: statistics(_resample_counts(counts2, n_resamples, seed2, workers))}
+    difference_label = f"{ref_group_label} − {comp_group_label}"
+    estimates[difference_label] = {stat: estimates[ref_group_label][stat] - estimates[comp_group_label][stat] for stat in estimates[ref_group_label]}
+    resampled[difference_label] = {stat: resampled[ref_group_label][stat] - resampled[comp_group_label][stat] for stat in resampled[ref_group_label]}
+
+    alpha = (1 - confidence) / 2
+    rows = []
+    for group, group_estimates in estimates.items():
+        for stat, estimate in group_estimates.items():
+            lower, upper = np.quantile(resampled[group][stat], [alpha, 1 - alpha])
+            rows.append({'Group': group, 'Statistic': stat, 'Estimate': float(estimate), 'CI Lower': lower, 'CI Upper': upper})
+    return pd.DataFrame(rows).round(2)
@@ -1,11 +1,45 @@
 # src/config.py
 import os
-import altair as alt
 
 # --- File Paths ---
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 RAW_DATA_PATH = os.path.join(PROJECT_ROOT, "data", "gps_2023.csv")
 PROCESSED_DATA_PATH = os.path.join(PROJECT_ROOT, "data", "processed_data.parquet")
+AGGREGATE_CUBE_PATH = os.path.join(PROJECT_ROOT, "data", "aggregate_cube.parquet") # Optional, built by preprocessing
+BENCHMARK_RESULTS_DIR = os.path.join(PROJECT_ROOT, "benchmark_results") # Written by src/benchmarks.py
+
+# --- Timing Instrumentation (src/timing.py) ---
+TIMING_ENABLED = os.environ.get("GPS_TIMING", "0") not in ("", "0") # Record every rerun (the sidebar panel can also enable it per session)
+TIMING_LOG_PATH = os.environ.get("GPS_TIMING_LOG") or None # JSON lines file for finished runs (None = stderr)
+
+# --- Shared Dataset (src/shared_data.py) ---
+SHARED_DATASET = os.environ.get("GPS_SHARED_DATASET", "1") not in ("", "0") # Sessions share one memory-mapped copy (0 = a private copy each)
+SHARED_DATASET_DIR = os.path.join(PROJECT_ROOT, "data", "shared") # Arrow IPC exports of the processed file, one per dataset version
+
+# --- Selection Memo (src/memo.py) ---
+SELECTION_MEMO_SIZE = 256 # Per-selection results (pair frames, stats, tests, chart specs) kept across reruns and sessions
+
+# --- Start-up Import Budget (src/import_profile.py) ---
+STARTUP_MODULES = ['streamlit', 'src.config', 'src.data_loader', 'src.plotting', 'src.analysis', 'src.groups', 'src.bootstrap'] # What a page imports
+LAZY_IMPORTS = ['scipy', 'PIL', 'matplotlib', 'plotly', 'vl_convert'] # Must not be imported by STARTUP_MODULES
+IMPORT_TIME_BUDGET_MS = 1500 # Cold import of STARTUP_MODULES (`python -m src.import_profile --check`)
+
+# --- Stats API (src/stats_api.py) ---
+STATS_API_HOST = os.environ.get("GPS_STATS_API_HOST", "127.0.0.1") # Local only by default
+STATS_API_PORT = int(os.environ.get("GPS_STATS_API_PORT", "8765"))
+STATS_API_CACHE_SIZE = 4096 # Encoded JSON responses kept per process (one per query and dataset version)
+
+# --- Statistical Tests ---
+MONTE_CARLO_RESAMPLES = 10000 # Tables drawn for the Monte Carlo chi-squared test (used when expected counts < 5)
+MONTE_CARLO_SEED = 0 # Fixed, so repeated runs (and cached results) report the same p-value
+BOOTSTRAP_RESAMPLES = 2000 # Resamples per bootstrap confidence interval (src/bootstrap.py)
+BOOTSTRAP_CONFIDENCE = 0.95
+BOOTSTRAP_SEED = 0
+BOOTSTRAP_WORKERS = 0 # Threads drawing resamples of large groups (0 = all cores, 1 = serial)
+
+# --- Preprocessing ---
+PREPROCESSING_CHUNKSIZE = None # Rows per chunk to stream the raw CSV (None = load it whole)
+PREPROCESSING_WORKERS = 1 # Processes cleaning column families in parallel (1 = serial, 0 = all cores)
 
 # --- Substance Columns & Names (User-friendly key -> actual column name suffix in raw data) ---
 SUBSTANCE_NAME_MAP = {
@@ -33,6 +67,7 @@ ALL_OTHER_RESPONDENTS = "All Other Respondents (Non-Reference)"
 # --- Default Selections ---
 DEFAULT_REFERENCE_SUBSTANCE = 'Ibogaine'
 DEFAULT_COMPARISON_SUBSTANCES = ['Psilocybin']
+DEFAULT_MULTI_GROUP_COMPARISONS = ['Psilocybin', 'LSD', 'MDMA/MDA', 'Ketamine', 'DMT/5-MeO-DMT'] # Multi-group page
 
 # --- Column Mappings ---
 DEMOGRAPHIC_COLS = {
@@ -57,6 +92,8 @@ DEMOGRAPHICS_PAGE_CATEGORICAL_PLOT_TYPES = ["Faceted Pie Charts"] # Only Pie Cha
 DEMOGRAPHICS_PAGE_NUMERICAL_PLOT_TYPES = ["Density + Box Plot"]   # Only Density + Box
 
 DEFAULT_PALETTE_NAME = "Classic Blue/Orange" 
+ALTAIR_THEME = 'latimes' # Enabled by src/plotting.py (config itself does not import Altair)
+DEFAULT_MULTI_GROUP_PALETTE_NAME = "Okabe-Ito (Custom)" # Enough distinct colors for several groups
 
 # --- Plot Types (Per-page definition is better) ---
 DEMOGRAPHICS_CATEGORICAL_PLOT_TYPES = ["Grouped Bar (Percentage)", "Grouped Bar (Count)", "Faceted Pie Charts"]
@@ -64,6 +101,12 @@ DEMOGRAPHICS_NUMERICAL_PLOT_TYPES = ["Density + Box Plot", "Overlapping Histogra
 # For Demographics specific request:
 DEMOGRAPHICS_PAGE_NUMERICAL_DEFAULT = "Density + Box Plot"
 
+# KDE bandwidth rules for density plots (computed server-side in src/plotting.py)
+KDE_BANDWIDTH_METHODS = {
+    "Auto (Scott, Vega default)": 'scott',
+    "Silverman": 'silverman',
+}
+
 # In standalone_age_dist_plot.py, or could be moved to config.py
 # This list defines the color for rank #1 peak, rank #2 peak, etc.
 # Tallest peak gets first color, second tallest gets second color, etc.
@@ -99,5 +142,3 @@ SUBSTANCE_COLOR_MAP = {
     # Fallback color for any substance not explicitly in this map
     'FallbackColor': '#808080'       # Grey
 }
-
-alt.themes.enable('latimes')
\ No newline at end of file
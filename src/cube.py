@@ -0,0 +1,194 @@
+# src/cube.py
+# Offline aggregate cube: summary tables, box-plot quantiles and test results for every
+# (reference, comparison, mutually_exclusive, variable) combination of the Demographics page.
+# Pages read from it when present (and current) and fall back to live computation otherwise.
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src import config # Use 'from src import config'
+from src.analysis import _get_cleaned_col_name, calculate_summary_stats, grouped_stats, perform_comparison_tests
+from src.groups import GroupIndex, build_comparison_frame, group_display_labels
+from src.versioning import dataset_version
+
+CUBE_KEY_COLS = ['reference', 'comparison', 'mutually_exclusive', 'variable']
+CUBE_VERSION_KEY = b'dataset_version'
+CUBE_CODE_KEY = b'code_fingerprint'
+CUBE_SOURCES = ('analysis.py', 'cube.py', 'groups.py', 'pairwise_tests.py') # Edits make existing cubes stale
+GROUP_COL = 'group_for_plot'
+
+
+def code_fingerprint():
+    """Hash of the modules that compute the cube's contents, stored with the cube next to the dataset version."""
+    digest = hashlib.sha1()
+    for file_name in CUBE_SOURCES:
+        with open(os.path.join(config.PROJECT_ROOT, 'src', file_name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def _combination_records(df_pair, col_name, ref_label, comp_label):
+    """Long-format cube records for one combination's comparison frame."""
+    records = []
+    group_counts = df_pair[GROUP_COL].value_counts()
+    if df_pair.empty or group_counts.get(ref_label, 0) == 0 or group_counts.get(comp_label, 0) == 0:
+        return [{'record': 'status', 'stat': 'insufficient'}]
+
+    grouped = grouped_stats(df_pair, col_name, GROUP_COL) # Shared by the summary table and the box plot
+    stats_dict = calculate_summary_stats(df_pair, col_name, GROUP_COL, grouped)
+    if stats_dict['type'] == 'numerical':
+        for row in stats_dict['dataframe'].to_dict('records'):
+            group = row.pop('Group')
+            records += [{'record': 'summary', 'group': group, 'stat': stat, 'value': value} for stat, value in row.items()]
+        box_df = grouped.boxplot_frame(GROUP_COL)
+        for row in box_df.to_dict('records'):
+            group = row.pop(GROUP_COL)
+            records += [{'record': 'boxplot', 'group': group, 'stat': stat, 'value': value} for stat, value in row.items()]
+    else:
+        for (group, category), row in stats_dict['dataframe'].iterrows():
+            records.append({'record': 'summary', 'group': group, 'category': str(category), 'stat': 'N', 'value': row['N']})
+            records.append({'record': 'summary', 'group': group, 'category': str(category), 'stat': 'Percentage',
+                            'value': float(row['Percentage (%)'].rstrip('%'))})
+
+    test_text, p_value = perform_comparison_tests(df_pair, col_name, ref_label, comp_label, GROUP_COL)
+    records.append({'record': 'test', 'stat': 'p_value', 'value': np.nan if p_value is None else p_value, 'text': test_text})
+    return records
+
+def build_aggregate_cube(df, substances=None, variables=None):
+    """
+    Computes the long-format cube for every group pair and variable.
+    `df` needs the q18 substance flags and the `variables` columns (default: DEMOGRAPHIC_COLS).
+    """
+    substances = substances or config.SUBSTANCE_NAMES_SORTED
+    variables = variables or [col_name for col_name, _col_type in config.DEMOGRAPHIC_COLS.values()]
+    group_index = GroupIndex.from_frame(df)
+    rows = []
+    for reference in substances:
+        if reference not in group_index:
+            continue
+        comparisons = [config.ALL_OTHER_RESPONDENTS] + [s for s in substances if s != reference and s in group_index]
+        for comparison in comparisons:
+            for mutually_exclusive in (True, False):
+                selection = group_index.select(reference, comparison, mutually_exclusive)
+                ref_label, comp_label = group_display_labels(reference, comparison, mutually_exclusive)
+                for col_name in variables:
+                    df_pair = build_comparison_frame(df, selection, [col_name], ref_label, comp_label, GROUP_COL)
+                    key = {'reference': reference, 'comparison': comparison,
+                           'mutually_exclusive': mutually_exclusive, 'variable': col_name}
+                    rows += [{**key, **record} for record in _combination_records(df_pair, col_name, ref_label, comp_label)]
+
+    cube = pd.DataFrame(rows, columns=CUBE_KEY_COLS + ['record', 'group', 'category', 'stat', 'value', 'text'])
+    cube['value'] = cube['value'].astype('float64')
+    for col in ['reference', 'comparison', 'variable', 'record', 'group', 'category', 'stat']:
+        cube[col] = cube[col].astype('category')
+    return cube
+
+def write_aggregate_cube(processed_path, cube_path):
+    """Builds the cube from the processed Parquet file and writes it next to it, tagged with the dataset version and code fingerprint."""
+    columns = list(config.FULL_SUBSTANCE_COL_NAMES.values()) + [col for col, _ in config.DEMOGRAPHIC_COLS.values()]
+    available = set(pq.read_schema(processed_path).names)
+    df = pd.read_parquet(processed_path, columns=[col for col in columns if col in available])
+    for col_name, col_type in config.DEMOGRAPHIC_COLS.values():
+        if col_type == 'categorical' and col_name in df.columns and df[col_name].dtype != 'category':
+            df[col_name] = df[col_name].astype('category')
+
+    print(f"Building aggregate cube from {processed_path}...")
+    cube = build_aggregate_cube(df)
+    table = pa.Table.from_pandas(cube, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[CUBE_VERSION_KEY] = (dataset_version(processed_path) or '').encode()
+    metadata[CUBE_CODE_KEY] = code_fingerprint().encode()
+    pq.write_table(table.replace_schema_metadata(metadata), cube_path)
+    print(f"Aggregate cube ({len(cube)} records) saved to {cube_path}")
+    return cube
+
+def _stale_reason(metadata, expected_version):
+    """Why a cube with schema `metadata` is stale (another dataset version or analysis code), or None if current."""
+    built_version = metadata.get(CUBE_VERSION_KEY, b'').decode()
+    if expected_version is not None and built_version != expected_version:
+        return f"built for {built_version or 'unknown'}, data is {expected_version}"
+    if metadata.get(CUBE_CODE_KEY, b'').decode() != code_fingerprint():
+        return "built by different analysis code"
+    return None
+
+def cube_is_current(cube_path, expected_version):
+    """True if the cube at `cube_path` exists and was built from `expected_version` by the current analysis code."""
+    try:
+        metadata = pq.read_schema(cube_path).metadata or {}
+    except FileNotFoundError:
+        return False
+    return _stale_reason(metadata, expected_version) is None
+
+
+class AggregateCube:
+    """Read-side lookups into a precomputed cube; every lookup returns None on a miss."""
+
+    def __init__(self, cube_df):
+        self._entries = {
+            key: entry.reset_index(drop=True)
+            for key, entry in cube_df.groupby(CUBE_KEY_COLS, observed=True, sort=False)
+        }
+
+    @classmethod
+    def read(cls, cube_path, expected_version=None):
+        """Loads the cube, or returns None if it is missing or was built from another dataset version or analysis code."""
+        try:
+            table = pq.read_table(cube_path)
+        except FileNotFoundError:
+            return None
+        stale_reason = _stale_reason(table.schema.metadata or {}, expected_version)
+        if stale_reason is not None:
+            print(f"Ignoring stale aggregate cube {cube_path} ({stale_reason})")
+            return None
+        return cls(table.to_pandas())
+
+    def _entry(self, reference, comparison, mutually_exclusive, col_name, record):
+        entry = self._entries.get((reference, comparison, bool(mutually_exclusive), col_name))
+        if entry is None:
+            return None
+        return entry[entry['record'] == record]
+
+    def is_insufficient(self, reference, comparison, mutually_exclusive, col_name):
+        status = self._entry(reference, comparison, mutually_exclusive, col_name, 'status')
+        return status is not None and not status.empty
+
+    def summary_stats(self, reference, comparison, mutually_exclusive, col_name, col_type):
+        """Rebuilds the `calculate_summary_stats` result dict for a combination."""
+        summary = self._entry(reference, comparison, mutually_exclusive, col_name, 'summary')
+        if summary is None or summary.empty:
+            return None
+        cleaned_col_name_for_display = _get_cleaned_col_name(col_name)
+        groups = summary['group'].astype(str)
+        if col_type == 'numerical':
+            stat_order = list(dict.fromkeys(summary['stat'].astype(str)))
+            table = summary.assign(group=groups, stat=summary['stat'].astype(str)).pivot(index='group', columns='stat', values='value')
+            table = table[stat_order].rename_axis(index='Group', columns=None).reset_index()
+            table['N'] = table['N'].astype('int64')
+            return {'type': 'numerical', 'dataframe': table,
+                    'title': f"Summary Statistics for '{cleaned_col_name_for_display}'"}
+        table = summary.assign(group=groups, category=summary['category'].astype(str), stat=summary['stat'].astype(str))
+        table = table.pivot(index=['group', 'category'], columns='stat', values='value').rename_axis(index=['Group', 'Category'], columns=None)
+        table = pd.DataFrame({'N': table['N'].astype('int64'), 'Percentage (%)': table['Percentage'].round(1).astype(str) + '%'})
+        return {'type': 'categorical', 'dataframe': table.sort_index(),
+                'title': f"Distribution for '{cleaned_col_name_for_display}'"}
+
+    def boxplot_stats(self, reference, comparison, mutually_exclusive, col_name, group_col=GROUP_COL):
+        """Box-plot quantiles in the `_calculate_boxplot_stats` layout."""
+        box = self._entry(reference, comparison, mutually_exclusive, col_name, 'boxplot')
+        if box is None or box.empty:
+            return None
+        table = box.assign(group=box['group'].astype(str), stat=box['stat'].astype(str)).pivot(index='group', columns='stat', values='value')
+        table = table[['min_val', 'q1', 'median', 'q3', 'max_val', 'count']].rename_axis(index=group_col, columns=None).reset_index()
+        table['count'] = table['count'].astype('int64')
+        return table
+
+    def comparison_test(self, reference, comparison, mutually_exclusive, col_name):
+        """(test_results_str, p_value) as returned by `perform_comparison_tests`."""
+        test = self._entry(reference, comparison, mutually_exclusive, col_name, 'test')
+        if test is None or test.empty:
+            return None
+        row = test.iloc[0]
+        return row['text'], (None if pd.isna(row['value']) else float(row['value']))
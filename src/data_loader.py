@@ -1,27 +1,133 @@
 # src/data_loader.py
 import streamlit as st
 import pandas as pd
+import pyarrow.parquet as pq
 from src import config # Use 'from src import config'
+from src import shared_data
+from src.cube import AggregateCube
+from src.groups import GroupIndex
+from src.memo import SelectionMemo
+from src.timing import span
+from src.versioning import dataset_version
 
-@st.cache_data
-def load_processed_data():
-    """Loads the processed Parquet data file."""
-    try:
-        df = pd.read_parquet(config.PROCESSED_DATA_PATH)
-        print(f"Loaded processed data from: {config.PROCESSED_DATA_PATH}")
 
-        # Ensure categorical columns loaded correctly
-        for _friendly_name, (col_name, col_type) in config.DEMOGRAPHIC_COLS.items():
-            if col_type == 'categorical' and col_name in df.columns:
-                if df[col_name].dtype != 'category':
-                     df[col_name] = df[col_name].astype('category')
-        # Add similar checks for other known categorical columns if needed
+def _read_columns(columns=None):
+    """Reads `columns` (or every column if None) from the processed Parquet file, skipping unknown names."""
+    if columns is not None:
+        known = set(available_columns(dataset_version()))
+        columns = [col for col in dict.fromkeys(columns) if col in known]
+    with span('read_parquet', columns=len(columns) if columns is not None else 'all'):
+        return pd.read_parquet(config.PROCESSED_DATA_PATH, columns=columns)
 
-        return df
+@st.cache_data(max_entries=2)
+def available_columns(version=None):
+    """Column names in the processed data file of dataset `version`, read from the Parquet footer only."""
+    return pq.read_schema(config.PROCESSED_DATA_PATH).names
+
+def page_column_manifest(*extra_cols):
+    """
+    Column manifest for pages comparing substance groups: the q18 lifetime-use flags,
+    the demographic variables, plus any page-specific `extra_cols`.
+    """
+    manifest = list(config.FULL_SUBSTANCE_COL_NAMES.values())
+    manifest += [col_name for col_name, _col_type in config.DEMOGRAPHIC_COLS.values()]
+    manifest += list(extra_cols)
+    return tuple(dict.fromkeys(manifest))
+
+def load_processed_data(columns=None):
+    """
+    Loads the processed Parquet data file.
+    If `columns` (a page's column manifest) is given, only those columns are read.
+    Columns arrive in the compact dtypes preprocessing stored them with; nothing is recast here.
+    With `config.SHARED_DATASET` the frame is a read-only view of the shared, memory-mapped dataset
+    (see src/shared_data.py); otherwise each caller gets its own copy from `st.cache_data`. Either way the
+    cache is keyed on `dataset_version()`, so a rebuilt file is picked up without restarting the server.
+    """
+    try:
+        if config.SHARED_DATASET:
+            return shared_data.read_only_view(_shared_frame(_current_version(), columns))
+        return _load_private_copy(_current_version(), columns)
     except FileNotFoundError:
         st.error(f"❌ Processed data file not found: {config.PROCESSED_DATA_PATH}")
         st.error("Please run the preprocessing script first: `python src/preprocessing.py`")
         return None
     except Exception as e:
         st.error(f"Error loading processed data: {e}")
-        return None
\ No newline at end of file
+        return None
+
+@st.cache_data
+def _load_private_copy(version, columns=None):
+    df = _read_columns(columns)
+    print(f"Loaded processed data from: {config.PROCESSED_DATA_PATH} ({df.shape[1]} columns)")
+    return df
+
+def load_column(col_name):
+    """Lazily reads a single column outside a page's manifest; cached per column on first use."""
+    if config.SHARED_DATASET:
+        return shared_data.read_only_view(_shared_frame(_current_version(), (col_name,)))[col_name]
+    return _load_private_column(_current_version(), col_name)
+
+@st.cache_data
+def _load_private_column(version, col_name):
+    return _read_columns([col_name])[col_name]
+
+# --- Shared Dataset (config.SHARED_DATASET) ---
+
+def _current_version():
+    version = dataset_version()
+    if version is None:
+        raise FileNotFoundError(config.PROCESSED_DATA_PATH)
+    return version
+
+@st.cache_resource(max_entries=2)
+def _shared_table(version):
+    """The dataset memory-mapped once per server process and dataset `version`."""
+    with span('map_shared_dataset'):
+        table = shared_data.map_dataset(config.PROCESSED_DATA_PATH, version)
+    print(f"Mapped shared dataset {shared_data.arrow_path(version)} ({table.num_columns} columns)")
+    return table
+
+@st.cache_resource(max_entries=32)
+def _shared_frame(version, columns=None):
+    """One pandas frame per dataset version and column manifest, shared by every session of the process."""
+    with span('shared_table_to_frame'):
+        return shared_data.table_to_frame(_shared_table(version), columns)
+
+def with_columns(df, col_names):
+    """
+    Returns `df` (a frame from `load_processed_data`, rows in file order) with any of
+    `col_names` it lacks fetched via `load_column`. Existing columns are untouched.
+    """
+    missing = [col for col in col_names if col not in df.columns]
+    if not missing:
+        return df
+    extra = pd.concat([load_column(col) for col in missing], axis=1)
+    extra.index = df.index
+    return pd.concat([df, extra], axis=1)
+
+@st.cache_resource(max_entries=2)
+def load_group_index(version=None):
+    """
+    Builds the substance GroupIndex once per server process and dataset `version` (pass
+    `dataset_version()`), so a rebuilt processed file never pairs with masks of the old one.
+    """
+    try:
+        df_flags = _read_columns(config.FULL_SUBSTANCE_COL_NAMES.values())
+    except FileNotFoundError:
+        return None
+    with span('build_group_index'):
+        return GroupIndex.from_frame(df_flags)
+
+@st.cache_resource
+def load_aggregate_cube(version=None):
+    """
+    Loads the precomputed aggregate cube once per dataset `version` (pass `dataset_version()`).
+    Returns None if the cube is missing or stale, in which case pages compute live.
+    """
+    with span('read_aggregate_cube'):
+        return AggregateCube.read(config.AGGREGATE_CUBE_PATH, expected_version=version or dataset_version())
+
+@st.cache_resource
+def load_selection_memo():
+    """The process-wide memo of per-selection page results (see src/memo.py)."""
+    return SelectionMemo(config.SELECTION_MEMO_SIZE)
@@ -0,0 +1,161 @@
+# src/groups.py
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from src import config # Use 'from src import config'
+
+
+@dataclass(frozen=True)
+class GroupSelection:
+    """Row positions of a reference/comparison group pair (no data copied)."""
+    reference: str
+    comparison: str
+    mutually_exclusive: bool
+    ref_positions: np.ndarray
+    comp_positions: np.ndarray
+
+    @property
+    def n_ref(self):
+        return len(self.ref_positions)
+
+    @property
+    def n_comp(self):
+        return len(self.comp_positions)
+
+
+class GroupIndex:
+    """
+    Packed boolean membership masks and row positions for every substance group.
+
+    Built once per dataset so that switching groups on a page is a couple of
+    bitwise operations on packed masks instead of full-frame boolean indexing.
+    """
+
+    def __init__(self, n_rows, packed_masks):
+        self.n_rows = n_rows
+        self._packed = packed_masks
+        self._positions = {name: self._to_positions(packed) for name, packed in packed_masks.items()}
+
+    @classmethod
+    def from_frame(cls, df, substance_col_map=None):
+        """Builds the index from the q18 lifetime-use flags of `df`."""
+        substance_col_map = substance_col_map or config.FULL_SUBSTANCE_COL_NAMES
+        packed_masks = {}
+        for substance_name, col_name in substance_col_map.items():
+            if col_name not in df.columns:
+                continue
+            # Same membership rule the pages used: only an explicit True counts (NA -> not a member)
+            is_member = (df[col_name] == True).to_numpy(dtype=bool, na_value=False)
+            packed_masks[substance_name] = np.packbits(is_member)
+        return cls(len(df), packed_masks)
+
+    def _to_positions(self, packed):
+        return np.flatnonzero(np.unpackbits(packed, count=self.n_rows))
+
+    def __contains__(self, substance_name):
+        return substance_name in self._packed
+
+    @property
+    def substances(self):
+        return list(self._packed.keys())
+
+    def positions(self, substance_name):
+        """Row positions (into the source frame) of users of `substance_name`."""
+        return self._positions[substance_name]
+
+    def count(self, substance_name):
+        return len(self._positions[substance_name])
+
+    def mask(self, substance_name):
+        """Unpacked boolean mask for `substance_name` (length `n_rows`)."""
+        return np.unpackbits(self._packed[substance_name], count=self.n_rows).astype(bool)
+
+    def select(self, reference, comparison, mutually_exclusive=True):
+        """
+        Resolves a (reference, comparison, mutually_exclusive) query to row positions.
+
+        `comparison` may be a substance name or `config.ALL_OTHER_RESPONDENTS`.
+        Unknown substance names raise KeyError.
+        """
+        ref_packed = self._packed[reference]
+        if comparison == config.ALL_OTHER_RESPONDENTS:
+            comp_positions = self._to_positions(~ref_packed) # Padding bits are dropped by unpackbits(count=...)
+        elif mutually_exclusive:
+            comp_positions = self._to_positions(self._packed[comparison] & ~ref_packed)
+        else:
+            comp_positions = self._positions[comparison]
+        return GroupSelection(
+            reference=reference,
+            comparison=comparison,
+            mutually_exclusive=mutually_exclusive,
+            ref_positions=self._positions[reference],
+            comp_positions=comp_positions,
+        )
+
+    def select_many(self, reference, comparisons, mutually_exclusive=True):
+        """
+        Resolves a reference and several comparison groups at once: {substance name: row positions},
+        reference first. Each comparison is resolved as in `select` (the reference is left out of it
+        if `mutually_exclusive`); respondents may still belong to several comparison groups.
+        """
+        groups = {reference: self._positions[reference]}
+        for comparison in comparisons:
+            if comparison != reference:
+                groups[comparison] = self.select(reference, comparison, mutually_exclusive).comp_positions
+        return groups
+
+
+# --- Labels & Comparison Frames ---
+
+def group_display_labels(reference, comparison, mutually_exclusive):
+    """Display labels for a reference/comparison pair, as shown on the pages."""
+    ref_group_label = f"{reference} Users" # Simplified
+    if comparison == config.ALL_OTHER_RESPONDENTS:
+        comp_group_label = config.ALL_OTHER_RESPONDENTS
+    else:
+        comp_group_label = f"{comparison} Users" # Simplified
+        if mutually_exclusive and reference != comparison:
+            comp_group_label += f" (Non-{reference})"
+    return ref_group_label, comp_group_label
+
+def multi_group_display_labels(reference, comparisons, mutually_exclusive):
+    """{substance name: display label} for a reference and several comparisons, reference first."""
+    labels = {reference: group_display_labels(reference, reference, mutually_exclusive)[0]}
+    for comparison in comparisons:
+        if comparison != reference:
+            labels[comparison] = group_display_labels(reference, comparison, mutually_exclusive)[1]
+    return labels
+
+def build_group_frame(df, group_positions, value_cols, group_col='group_for_plot', dropna=True):
+    """
+    Builds a narrow labeled frame for comparing groups, taking rows by position from `df`.
+
+    `group_positions` maps each group label to row positions in `df` (e.g. from a GroupSelection).
+    Only `value_cols` are gathered, plus `group_col` as a categorical label. Respondents in more
+    than one group appear once per group, but only in these narrow columns, never as full rows.
+    With `dropna`, rows missing any of `value_cols` are left out before gathering.
+    """
+    value_cols = list(value_cols)
+    labels = list(group_positions.keys())
+    if dropna and value_cols:
+        has_values = df[value_cols].notna().all(axis=1).to_numpy()
+        group_positions = {label: pos[has_values[pos]] for label, pos in group_positions.items()}
+
+    positions = np.concatenate([np.asarray(pos, dtype=np.intp) for pos in group_positions.values()])
+    # Sorted categories keep group ordering identical to the old string-labelled frames
+    sorted_labels = sorted(labels)
+    label_codes = np.array([sorted_labels.index(label) for label in labels], dtype=np.int8)
+    codes = np.repeat(label_codes, [len(pos) for pos in group_positions.values()])
+
+    data = {col: df[col].array.take(positions) for col in value_cols}
+    data[group_col] = pd.Categorical.from_codes(codes, categories=sorted_labels)
+    return pd.DataFrame(data)
+
+def build_comparison_frame(df, selection, value_cols, ref_group_label, comp_group_label, group_col='group_for_plot', dropna=True):
+    """Two-group `build_group_frame` for a GroupSelection (reference rows first)."""
+    return build_group_frame(
+        df,
+        {ref_group_label: selection.ref_positions, comp_group_label: selection.comp_positions},
+        value_cols, group_col=group_col, dropna=dropna,
+    )
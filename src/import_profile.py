@@ -0,0 +1,103 @@
+# src/import_profile.py
+# Cold-start import profile: imports the modules a page loads at start-up in a fresh interpreter
+# under `python -X importtime` and reports the wall-clock import time, the cumulative cost per
+# top-level package and the most expensive individual modules. With --check it exits non-zero
+# when the cold import exceeds the budget or when a module that should load lazily (scipy, PIL,
+# ...) was imported at start-up. Nothing runs it automatically (the repo has no CI or test suite):
+# it is a manual check, to run before merging changes to what the pages import at start-up.
+#
+#   python -m src.import_profile
+#   python -m src.import_profile --check --budget-ms 2500
+import argparse
+import json
+import subprocess
+import sys
+
+from src import config # Use 'from src import config'
+
+_MARKER = '-- import profile start --'
+_SCRIPT = f"""
+import json, sys, time
+sys.stderr.write({_MARKER!r} + '\\n'); sys.stderr.flush()
+start = time.perf_counter()
+for name in sys.argv[1:]:
+    __import__(name)
+print(json.dumps({{'seconds': time.perf_counter() - start, 'modules': sorted(sys.modules)}}))
+"""
+
+
+def _parse_importtime(stderr):
+    """[(module, depth, self_us, cumulative_us)] from `-X importtime` output after the start marker."""
+    lines = stderr.splitlines()
+    if _MARKER in lines:
+        lines = lines[lines.index(_MARKER) + 1:]
+    entries = []
+    for line in lines:
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        entries.append((name.strip(), (len(name) - len(name.lstrip()) - 1) // 2, int(self_us), int(cumulative_us)))
+    return entries
+
+def profile_imports(modules=None, repeat=3):
+    """
+    Imports `modules` (default: config.STARTUP_MODULES) `repeat` times, each in a fresh interpreter.
+    Returns the fastest run: {'seconds', 'packages': {package: self ms}, 'modules': [(module, self ms, cumulative ms)],
+    'lazy_violations': [lazily loaded packages that were imported]}.
+    """
+    modules = list(modules or config.STARTUP_MODULES)
+    best = None
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', _SCRIPT, *modules],
+                                   cwd=config.PROJECT_ROOT, capture_output=True, text=True, check=True)
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        if best is None or result['seconds'] < best[0]['seconds']:
+            best = (result, completed.stderr)
+    result, stderr = best
+
+    entries = _parse_importtime(stderr)
+    packages = {} # Self times summed per top-level package: each module's cost counted once, where it is defined
+    for name, _depth, self_us, _cumulative_us in entries:
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + self_us / 1000
+    loaded_packages = {name.split('.')[0] for name in result['modules']}
+    return {
+        'seconds': result['seconds'],
+        'packages': dict(sorted(packages.items(), key=lambda item: -item[1])),
+        'modules': sorted(((name, self_us / 1000, cumulative_us / 1000) for name, _depth, self_us, cumulative_us in entries),
+                          key=lambda item: -item[1]),
+        'lazy_violations': sorted(loaded_packages & set(config.LAZY_IMPORTS)),
+    }
+
+def print_profile(profile, top=20):
+    print(f"Cold import of the start-up modules: {profile['seconds'] * 1000:.0f} ms")
+    print(f"\nImport time per top-level package (ms, top {top}):")
+    for package, ms in list(profile['packages'].items())[:top]:
+        print(f"  {package:<28} {ms:8.1f}")
+    print(f"\nTop {top} modules by self time (ms):")
+    for name, self_ms, cumulative_ms in profile['modules'][:top]:
+        print(f"  {name:<48} {self_ms:8.1f}  (cumulative {cumulative_ms:.1f})")
+    if profile['lazy_violations']:
+        print(f"\nImported at start-up but meant to load lazily: {', '.join(profile['lazy_violations'])}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile the cold import time of the app's start-up modules.")
+    parser.add_argument("--modules", nargs="+", help="Modules to import (default: config.STARTUP_MODULES)")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters to run; the fastest is reported")
+    parser.add_argument("--top", type=int, default=20, help="Modules to list")
+    parser.add_argument("--check", action="store_true", help="Exit non-zero if over budget or a lazy import leaked")
+    parser.add_argument("--budget-ms", type=float, default=config.IMPORT_TIME_BUDGET_MS)
+    args = parser.parse_args()
+
+    profile = profile_imports(args.modules, args.repeat)
+    print_profile(profile, args.top)
+    if args.check:
+        failures = []
+        if profile['seconds'] * 1000 > args.budget_ms:
+            failures.append(f"cold import took {profile['seconds'] * 1000:.0f} ms (budget {args.budget_ms:.0f} ms)")
+        if profile['lazy_violations']:
+            failures.append(f"lazily loaded packages imported at start-up: {', '.join(profile['lazy_violations'])}")
+        if failures:
+            print("\nFAILED: " + "; ".join(failures))
+            sys.exit(1)
+        print(f"\nOK: within the {args.budget_ms:.0f} ms budget, no lazy imports at start-up")
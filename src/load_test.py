@@ -0,0 +1,100 @@
+# src/load_test.py
+# Load test of the stats API (src/stats_api.py) on localhost: concurrent clients, each on its own
+# keep-alive connection, send random (reference, comparison, variable) queries for a fixed number
+# of requests and report throughput, latency percentiles and how often the server's response cache
+# answered. With --revalidate, clients send the ETag they last saw for a URL (expecting 304s).
+#
+#   python -m src.load_test --start-server --concurrency 16 --requests 5000
+#   python -m src.load_test --url http://127.0.0.1:8765 --revalidate
+import argparse
+import collections
+import http.client
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+
+from src import config # Use 'from src import config'
+
+
+def query_paths(metadata, endpoints=('/stats',)):
+    """Every (endpoint, reference, comparison, variable) query the API answers, as request paths."""
+    paths = []
+    for endpoint in endpoints:
+        for reference in metadata['references']:
+            for comparison in metadata['comparisons']:
+                if comparison == reference:
+                    continue
+                for variable in metadata['variables']:
+                    paths.append(f"{endpoint}?{urlencode({'reference': reference, 'comparison': comparison, 'variable': variable})}")
+    return paths
+
+def _client(host, port, paths, n_requests, seed, revalidate, etags):
+    """One client connection sending `n_requests` random queries; returns [(status, X-Cache, seconds)]."""
+    rng = random.Random(seed)
+    connection = http.client.HTTPConnection(host, port, timeout=60)
+    results = []
+    try:
+        for _ in range(n_requests):
+            path = rng.choice(paths)
+            headers = {'If-None-Match': etags[path]} if revalidate and path in etags else {}
+            start = time.perf_counter()
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            results.append((response.status, response.getheader('X-Cache'), time.perf_counter() - start))
+            if response.getheader('ETag'):
+                etags[path] = response.getheader('ETag')
+    finally:
+        connection.close()
+    return results
+
+def run_load_test(url, concurrency=8, n_requests=2000, endpoints=('/stats',), revalidate=False, seed=0):
+    """Runs the load test against `url`; returns a dict of throughput, latency and status/cache counts."""
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=60)
+    connection.request('GET', '/variables')
+    metadata = json.loads(connection.getresponse().read())
+    connection.close()
+    paths = query_paths(metadata, endpoints)
+
+    etags = {} # Shared between clients: a URL's ETag seen by one client is revalidated by all
+    per_client = [n_requests // concurrency + (i < n_requests % concurrency) for i in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        futures = [executor.submit(_client, parts.hostname, parts.port, paths, n, seed + i, revalidate, etags)
+                   for i, n in enumerate(per_client)]
+        results = [result for future in futures for result in future.result()]
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array([seconds for _status, _cache, seconds in results]) * 1000
+    return {
+        'url': url, 'concurrency': concurrency, 'requests': len(results), 'distinct_queries': len(paths),
+        'seconds': round(elapsed, 3), 'requests_per_second': round(len(results) / elapsed, 1),
+        'latency_ms': {**{f'p{q}': round(float(np.percentile(latencies_ms, q)), 2) for q in (50, 90, 99)}, 'max': round(float(latencies_ms.max()), 2)},
+        'status': dict(collections.Counter(status for status, _cache, _seconds in results)),
+        'cache': dict(collections.Counter(cache for _status, cache, _seconds in results)),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the stats API on localhost.")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{config.STATS_API_PORT}", help="Base URL of a running stats API")
+    parser.add_argument("--start-server", action="store_true", help="Start a stats API in this process (on a free port) and test it")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent client connections")
+    parser.add_argument("--requests", type=int, default=2000, help="Total requests")
+    parser.add_argument("--endpoints", nargs="+", default=['/stats'], choices=['/stats', '/summary', '/test'])
+    parser.add_argument("--revalidate", action="store_true", help="Send If-None-Match with previously seen ETags")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    url = args.url
+    if args.start_server:
+        from src.stats_api import serve_in_thread
+        server = serve_in_thread()
+        url = f"http://127.0.0.1:{server.server_port}"
+        print(f"Started stats API at {url}")
+    report = run_load_test(url, args.concurrency, args.requests, args.endpoints, args.revalidate, args.seed)
+    print(json.dumps(report, indent=2))
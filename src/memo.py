@@ -0,0 +1,57 @@
+# src/memo.py
+# Process-wide memo of per-selection page results (comparison frame, statistics, tests, chart
+# specs), each kind cached separately under a key of the selection and dataset version, so a
+# styling-only change rebuilds just the chart. Entries are evicted least recently used first.
+import threading
+from collections import OrderedDict
+
+from src.timing import span
+
+
+class SelectionMemo:
+    """Bounded LRU cache shared by all sessions, with hit/miss counters per kind of result."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, kind, key, compute):
+        """
+        The cached `kind` result for `key`, or `compute()`'s result (then cached). Results are shared
+        between sessions, so callers must not modify them. Concurrent misses may both compute.
+        """
+        entry_key = (kind,) + tuple(key)
+        with self._lock:
+            hit = entry_key in self._entries
+            self._counters.setdefault(kind, {'hits': 0, 'misses': 0})['hits' if hit else 'misses'] += 1
+            if hit:
+                self._entries.move_to_end(entry_key)
+                value = self._entries[entry_key]
+        with span(f'memo:{kind}', hit=hit): # Computation spans nest under a miss
+            if hit:
+                return value
+            value = compute()
+        with self._lock:
+            self._entries[entry_key] = value
+            self._entries.move_to_end(entry_key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def counters(self):
+        """{kind: {'hits': ..., 'misses': ..., 'entries': ...}} since the memo was created."""
+        with self._lock:
+            entries = {}
+            for entry_key in self._entries:
+                entries[entry_key[0]] = entries.get(entry_key[0], 0) + 1
+            return {kind: {**counts, 'entries': entries.get(kind, 0)} for kind, counts in self._counters.items()}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+
+    def __len__(self):
+        return len(self._entries)
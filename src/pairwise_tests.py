@@ -0,0 +1,281 @@
+# src/pairwise_tests.py
+# Batched significance screening: every reference substance against every comparison group
+# (other substances + "All Other Respondents") for every variable, in one vectorized pass.
+# Each variable is ranked/factorized once into per-group value histograms; the Mann-Whitney U
+# and chi-squared statistics for all pairs are then computed from those count tensors.
+# scipy is imported where a test needs it: pages import this module (through src.analysis) at
+# start-up, but only pay for scipy once a test is actually shown.
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from src import config # Use 'from src import config'
+from src.groups import GroupIndex
+
+P_VALUE_CORRECTIONS = ('bonferroni', 'holm', 'fdr_bh')
+MIN_GROUP_N = 3 # Same threshold as analysis.perform_comparison_tests
+
+
+# --- Count Tensors ---
+
+def _encode_variable(series):
+    """Returns (codes, levels, is_numeric); codes are -1 for NA. Numeric levels are the sorted distinct values."""
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        values = series.to_numpy(dtype='float64', na_value=np.nan)
+        valid = ~np.isnan(values)
+        levels, inverse = np.unique(values[valid], return_inverse=True) # The single sort ("rank once")
+        codes = np.full(len(values), -1, dtype=np.intp)
+        codes[valid] = inverse
+        return codes, levels, True
+    categorical = pd.Categorical(series)
+    return categorical.codes.astype(np.intp), np.asarray(categorical.categories), False
+
+def _group_counts(memberships, codes, n_levels):
+    """Histogram of `codes` for every group column of `memberships` (n x G bool) -> G x V counts."""
+    rows, groups = np.nonzero(memberships & (codes >= 0)[:, None])
+    flat = np.bincount(groups * n_levels + codes[rows], minlength=memberships.shape[1] * n_levels)
+    return flat.reshape(memberships.shape[1], n_levels)
+
+def _pair_count_tensors(memberships, codes, n_levels, mutually_exclusive):
+    """
+    Reference and comparison histograms for every (reference a, comparison j) pair.
+    Comparisons are the G substances followed by "All Other Respondents" (index G).
+    Returns (ref_counts G x V, comp_counts G x (G+1) x V).
+    """
+    n_groups = memberships.shape[1]
+    counts = _group_counts(memberships, codes, n_levels)
+    total = np.bincount(codes[codes >= 0], minlength=n_levels)
+
+    comp_counts = np.empty((n_groups, n_groups + 1, n_levels), dtype=np.int64)
+    comp_counts[:, :n_groups] = counts[None, :, :]
+    if mutually_exclusive:
+        for a in range(n_groups): # B \ A = B - (A & B), histogram-wise
+            comp_counts[a, :n_groups] -= _group_counts(memberships & memberships[:, [a]], codes, n_levels)
+    comp_counts[:, n_groups] = total[None, :] - counts
+    return counts, comp_counts
+
+
+# --- Test Statistics From Counts ---
+
+def _median_from_counts(levels, counts):
+    """Median (pandas convention: mean of the two middle values) of histograms along the last axis."""
+    n = counts.sum(axis=-1)
+    cum = np.cumsum(counts, axis=-1)
+    lower = np.argmax(cum > ((n - 1) // 2)[..., None], axis=-1)
+    upper = np.argmax(cum > (n // 2)[..., None], axis=-1)
+    median = (levels[lower] + levels[upper]) / 2
+    return np.where(n > 0, median, np.nan)
+
+def mannwhitneyu_from_counts(ref_counts, comp_counts):
+    """
+    Two-sided Mann-Whitney U from value histograms over the same sorted levels (last axis),
+    broadcasting over leading axes. Uses the tie-corrected normal approximation with continuity
+    correction, i.e. scipy's asymptotic method. Returns (U of the reference sample, p-value, n1, n2).
+    """
+    from scipy import special
+    ref_counts = np.asarray(ref_counts, dtype='float64')
+    comp_counts = np.asarray(comp_counts, dtype='float64')
+    n1, n2 = ref_counts.sum(axis=-1), comp_counts.sum(axis=-1)
+    comp_below = np.cumsum(comp_counts, axis=-1) - comp_counts
+    u1 = (ref_counts * (comp_below + 0.5 * comp_counts)).sum(axis=-1)
+
+    n = n1 + n2
+    tied = ref_counts + comp_counts
+    tie_term = (tied ** 3 - tied).sum(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigma = np.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1))))
+        u = np.maximum(u1, n1 * n2 - u1)
+        z = (u - n1 * n2 / 2 - 0.5) / sigma
+        p_value = np.clip(2 * special.ndtr(-z), 0, 1)
+    return u1, p_value, n1, n2
+
+def chi2_from_counts(ref_counts, comp_counts):
+    """
+    Chi-squared test of a 2 x V contingency table per leading index (as scipy.stats.chi2_contingency,
+    including Yates' correction when dof == 1). Empty categories are dropped per table.
+    Returns (chi2, p-value, dof, min expected count, n).
+    """
+    return chi2_from_table(np.stack([ref_counts, comp_counts], axis=-2)) # ... x 2 x V
+
+def chi2_from_table(observed):
+    """`chi2_from_counts` for R x V tables (one histogram per row, last two axes); rows should not be empty."""
+    from scipy import special
+    observed = np.asarray(observed, dtype='float64')
+    col_totals = observed.sum(axis=-2, keepdims=True)
+    row_totals = observed.sum(axis=-1, keepdims=True)
+    n = observed.sum(axis=(-2, -1))
+    present = col_totals > 0
+    dof = (observed.shape[-2] - 1) * (present.sum(axis=(-2, -1)) - 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = row_totals * col_totals / n[..., None, None]
+        diff = expected - observed
+        yates = (dof == 1)[..., None, None]
+        observed = np.where(yates, observed + np.sign(diff) * np.minimum(0.5, np.abs(diff)), observed)
+        terms = np.where(present, (observed - expected) ** 2 / expected, 0.0)
+        chi2 = terms.sum(axis=(-2, -1))
+        p_value = special.chdtrc(np.maximum(dof, 1), chi2)
+    chi2 = np.where(dof >= 1, chi2, np.nan)
+    p_value = np.where(dof >= 1, p_value, np.nan)
+    min_expected = np.where(present, expected, np.inf).min(axis=(-2, -1))
+    return chi2, p_value, dof, min_expected, n
+
+def kruskal_from_counts(counts):
+    """
+    Kruskal-Wallis H test of G x V group histograms over the same sorted levels (last two axes),
+    broadcasting over leading axes; tie-corrected, as scipy.stats.kruskal. Ranks come from the
+    cumulative level totals, so no values are sorted. Returns (H, p-value, dof).
+    """
+    from scipy import special
+    counts = np.asarray(counts, dtype='float64')
+    n_group = counts.sum(axis=-1)
+    totals = counts.sum(axis=-2)
+    n = totals.sum(axis=-1)
+    midranks = np.cumsum(totals, axis=-1) - (totals - 1) / 2 # Average rank of each level's tied values
+    rank_sums = (counts * midranks[..., None, :]).sum(axis=-1)
+    dof = counts.shape[-2] - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        h = 12 / (n * (n + 1)) * (rank_sums ** 2 / n_group).sum(axis=-1) - 3 * (n + 1)
+        h = h / (1 - (totals ** 3 - totals).sum(axis=-1) / (n ** 3 - n)) # NaN when every value is tied
+        p_value = special.chdtrc(dof, h)
+    return h, p_value, dof
+
+def fisher_exact_from_counts(ref_counts, comp_counts):
+    """Two-sided Fisher's exact test of a 2 x 2 table given as two group histograms. Returns (odds ratio, p-value)."""
+    from scipy import stats
+    return stats.fisher_exact(np.array([ref_counts, comp_counts], dtype=np.int64))
+
+def chi2_monte_carlo_from_counts(ref_counts, comp_counts, n_resamples=10000, seed=0):
+    """
+    Monte Carlo p-value of the chi-squared statistic (without continuity correction) of a 2 x V table,
+    conditioning on both margins, as R's chisq.test(simulate.p.value=TRUE). The smaller row of each table
+    is drawn from the multivariate hypergeometric distribution, at a cost of at most O(V) per table.
+    Returns (chi2, p-value).
+    """
+    observed = np.array([ref_counts, comp_counts], dtype=np.int64)
+    observed = observed[:, observed.sum(axis=0) > 0]
+    small_row = int(np.argmin(observed.sum(axis=1)))
+    col_totals = observed.sum(axis=0)
+    n_small = int(observed[small_row].sum())
+    expected = np.outer([n_small, col_totals.sum() - n_small], col_totals) / col_totals.sum()
+    # With both margins fixed the other row's deviations mirror the drawn row's, so the statistic is
+    # one weighted sum of squares per table
+    weights = 1 / expected[0] + 1 / expected[1]
+
+    def statistic(rows):
+        return ((rows - expected[0]) ** 2) @ weights
+
+    chi2 = statistic(observed[small_row])
+    # Drawing item by item beats drawing category by category when the smaller row is short
+    method = 'count' if n_small < 8 * len(col_totals) else 'marginals'
+    simulated = statistic(np.random.default_rng(seed).multivariate_hypergeometric(col_totals, n_small, size=n_resamples, method=method))
+    at_least = (simulated >= chi2 * (1 - 64 * np.finfo(float).eps)).sum() # Same tolerance for equal statistics as R
+    return chi2, (1 + at_least) / (1 + n_resamples)
+
+
+# --- Multiple Comparisons ---
+
+def adjust_p_values(p_values, method='fdr_bh'):
+    """Adjusts p-values for multiple comparisons ('bonferroni', 'holm' or 'fdr_bh'); NaNs are left out."""
+    p_values = np.asarray(p_values, dtype='float64')
+    adjusted = np.full(p_values.shape, np.nan)
+    valid = ~np.isnan(p_values)
+    p = p_values[valid]
+    m = len(p)
+    if m == 0:
+        return adjusted
+    if method == 'bonferroni':
+        adjusted[valid] = np.minimum(p * m, 1)
+        return adjusted
+    order = np.argsort(p, kind='mergesort')
+    ranked = p[order]
+    if method == 'holm':
+        stepped = np.maximum.accumulate((m - np.arange(m)) * ranked)
+    elif method == 'fdr_bh':
+        stepped = np.minimum.accumulate((ranked * m / np.arange(1, m + 1))[::-1])[::-1]
+    else:
+        raise ValueError(f"Unknown p-value correction: {method}")
+    result = np.empty(m)
+    result[order] = np.minimum(stepped, 1)
+    adjusted[valid] = result
+    return adjusted
+
+
+# --- Engine ---
+
+def compute_pairwise_tests(df, variables=None, substances=None, mutually_exclusive=True, correction_by=None, group_index=None):
+    """
+    Computes test statistics, p-values and effect sizes for every reference substance x comparison
+    group x variable. Numeric variables get Mann-Whitney U (effect size: rank-biserial correlation,
+    positive when the reference tends higher); categorical variables get chi-squared (Cramér's V).
+
+    `variables` are column names (default: DEMOGRAPHIC_COLS); `correction_by=None` corrects across
+    the whole matrix, 'variable' corrects within each variable. Returns a long DataFrame with one
+    row per (reference, comparison, variable).
+    """
+    variables = variables or [col_name for col_name, _col_type in config.DEMOGRAPHIC_COLS.values()]
+    group_index = group_index or GroupIndex.from_frame(df)
+    substances = [s for s in (substances or config.SUBSTANCE_NAMES_SORTED) if s in group_index]
+    comparisons = substances + [config.ALL_OTHER_RESPONDENTS]
+    memberships = np.column_stack([group_index.mask(s) for s in substances])
+    n_groups = len(substances)
+    ref_idx, comp_idx = np.nonzero(np.arange(n_groups)[:, None] != np.arange(n_groups + 1)[None, :])
+
+    frames = []
+    for col_name in variables:
+        codes, levels, is_numeric = _encode_variable(df[col_name])
+        ref_counts, comp_counts = _pair_count_tensors(memberships, codes, len(levels), mutually_exclusive)
+        pair_ref, pair_comp = ref_counts[ref_idx], comp_counts[ref_idx, comp_idx]
+        result = {
+            'reference': np.array(substances)[ref_idx],
+            'comparison': np.array(comparisons)[comp_idx],
+            'variable': col_name,
+        }
+        if is_numeric:
+            u1, p_value, n1, n2 = mannwhitneyu_from_counts(pair_ref, pair_comp)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                effect_size = 2 * u1 / (n1 * n2) - 1
+            result.update({
+                'test': 'Mann-Whitney U', 'n_ref': n1.astype(int), 'n_comp': n2.astype(int),
+                'statistic': u1, 'dof': np.nan, 'p_value': p_value,
+                'effect_size': effect_size, 'effect_size_name': 'rank-biserial',
+                'median_ref': _median_from_counts(levels, pair_ref), 'median_comp': _median_from_counts(levels, pair_comp),
+                'min_expected': np.nan,
+            })
+        else:
+            chi2, p_value, dof, min_expected, n = chi2_from_counts(pair_ref, pair_comp)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                effect_size = np.sqrt(chi2 / n)
+            result.update({
+                'test': 'Chi-squared', 'n_ref': pair_ref.sum(axis=-1), 'n_comp': pair_comp.sum(axis=-1),
+                'statistic': chi2, 'dof': dof.astype('float64'), 'p_value': p_value,
+                'effect_size': effect_size, 'effect_size_name': "Cramér's V",
+                'median_ref': np.nan, 'median_comp': np.nan, 'min_expected': min_expected,
+            })
+        frame = pd.DataFrame(result)
+        too_small = (frame['n_ref'] < MIN_GROUP_N) | (frame['n_comp'] < MIN_GROUP_N)
+        frame.loc[too_small, ['statistic', 'p_value', 'effect_size']] = np.nan
+        frames.append(frame)
+
+    results = pd.concat(frames, ignore_index=True)
+    results['mutually_exclusive'] = mutually_exclusive
+    correction_groups = [results.index] if correction_by is None else results.groupby(correction_by).groups.values()
+    for method in P_VALUE_CORRECTIONS:
+        results[f'p_{method}'] = np.nan
+        for index in correction_groups:
+            results.loc[index, f'p_{method}'] = adjust_p_values(results.loc[index, 'p_value'].to_numpy(), method)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Screen every substance pair x variable for significant differences.")
+    parser.add_argument("--output", default="pairwise_tests.csv", help="CSV file to write")
+    parser.add_argument("--variables", nargs="*", help="Column names to test (default: demographic variables)")
+    parser.add_argument("--no-mutually-exclusive", action="store_true", help="Keep reference users in comparison groups")
+    parser.add_argument("--correction-by", choices=["variable"], default=None, help="Correct p-values within each variable")
+    args = parser.parse_args()
+
+    variables = args.variables or [col_name for col_name, _col_type in config.DEMOGRAPHIC_COLS.values()]
+    df = pd.read_parquet(config.PROCESSED_DATA_PATH, columns=list(config.FULL_SUBSTANCE_COL_NAMES.values()) + variables)
+    results = compute_pairwise_tests(df, variables, mutually_exclusive=not args.no_mutually_exclusive, correction_by=args.correction_by)
+    results.to_csv(args.output, index=False)
+    print(f"Wrote {len(results)} pairwise tests to {args.output}")
@@ -1,7 +1,12 @@
 # src/plotting.py
 import altair as alt
+import numpy as np
 import pandas as pd
 from src import config # Use 'from src import config'
+from src.analysis import grouped_stats
+from src.timing import span, timed
+
+alt.themes.enable(config.ALTAIR_THEME) # Every chart is built here, so the theme is set where Altair is imported
 
 def _get_cleaned_col_name(col_name):
     """Helper to clean column names for titles and labels."""
@@ -28,20 +33,36 @@ def _create_color_scale(group_names_in_plot_data, selected_palette_config_value)
 
 
 # --- CATEGORICAL PLOT FUNCTIONS ---
+# All categorical charts receive one row per (group, category) with counts and percentages
+# already computed, so the spec grows with the number of categories, not respondents.
 
+def _category_counts(df_pair, col_name, group_col, include_empty=False):
+    """
+    Counts and within-group percentages per (group, category), NA values excluded.
+    `include_empty` keeps zero-count categories of a categorical `col_name`.
+    """
+    counts = df_pair.groupby([group_col, col_name], observed=not include_empty).size().rename('count').reset_index()
+    if not include_empty:
+        counts = counts[counts['count'] > 0].reset_index(drop=True)
+    group_totals = counts.groupby(group_col, observed=True)['count'].transform('sum')
+    counts['percentage'] = (counts['count'] / group_totals * 100).fillna(0.0)
+    return counts
+
+@timed()
 def plot_grouped_bar_percentage(df_pair, col_name, ref_group_label, comp_group_label, group_col_for_plot, palette_config_value):
+    return plot_groups_bar_percentage(df_pair, col_name, [ref_group_label, comp_group_label], group_col_for_plot, palette_config_value)
+
+@timed()
+def plot_groups_bar_percentage(df_groups, col_name, group_labels, group_col_for_plot, palette_config_value):
+    """Grouped bars of the % of each group in every category, for any number of groups."""
     y_axis_title = _get_cleaned_col_name(col_name)
-    chart_title = f"{ref_group_label} vs {comp_group_label}: {y_axis_title} (% within Group)"
-    # For grouped bars comparing two main groups, we usually color by those groups.
-    # The palette_config_value should be a list of two colors or a scheme suitable for two.
-    color_scale = _create_color_scale([ref_group_label, comp_group_label], palette_config_value)
+    chart_title = f"{' vs '.join(group_labels)}: {y_axis_title} (% within Group)"
+    # Bars are colored by group; the palette_config_value should have a color per group (lists cycle)
+    color_scale = _create_color_scale(group_labels, palette_config_value)
 
 
-    # Calculate percentage within each group for each category
-    plot_data = df_pair.groupby(group_col_for_plot)[col_name].value_counts(normalize=True).mul(100).rename('percentage').reset_index()
-    # Get counts for tooltips
-    counts_data = df_pair.groupby([group_col_for_plot, col_name]).size().rename('count').reset_index()
-    plot_data = pd.merge(plot_data, counts_data, on=[group_col_for_plot, col_name])
+    # Percentage within each group for each category (plus counts for tooltips)
+    plot_data = _category_counts(df_groups, col_name, group_col_for_plot, include_empty=True)
 
     chart = alt.Chart(plot_data).mark_bar(cornerRadiusTopLeft=3, cornerRadiusTopRight=3).encode(
         x=alt.X(f'{col_name}:N', title=y_axis_title, sort='-y', axis=alt.Axis(labelAngle=-45)), # Categories on X, sort by count
@@ -63,20 +84,23 @@ def plot_grouped_bar_percentage(df_pair, col_name, ref_group_label, comp_group_l
     )
     return chart
 
+@timed()
 def plot_grouped_bar_count(df_pair, col_name, ref_group_label, comp_group_label, group_col_for_plot, palette_config_value):
     y_axis_title = _get_cleaned_col_name(col_name)
     chart_title = f"{ref_group_label} vs {comp_group_label}: {y_axis_title} (Counts)"
     color_scale = _create_color_scale([ref_group_label, comp_group_label], palette_config_value)
 
-    chart = alt.Chart(df_pair).mark_bar(cornerRadiusTopLeft=3, cornerRadiusTopRight=3).encode(
+    plot_data = _category_counts(df_pair, col_name, group_col_for_plot)
+
+    chart = alt.Chart(plot_data).mark_bar(cornerRadiusTopLeft=3, cornerRadiusTopRight=3).encode(
         x=alt.X(f'{col_name}:N', title=y_axis_title, sort='-y', axis=alt.Axis(labelAngle=-45)),
-        y=alt.Y('count():Q', title='Number of Respondents'),
+        y=alt.Y('count:Q', title='Number of Respondents'),
         color=alt.Color(f'{group_col_for_plot}:N', scale=color_scale, legend=alt.Legend(title="User Group", orient="top-left")),
         xOffset=f'{group_col_for_plot}:N',
         tooltip=[
             alt.Tooltip(f'{group_col_for_plot}:N', title='Group'),
             alt.Tooltip(f'{col_name}:N', title=y_axis_title),
-            alt.Tooltip('count():Q', title='Count (N)')
+            alt.Tooltip('count:Q', title='Count (N)')
         ]
     ).properties(
         title=alt.TitleParams(text=chart_title, anchor="middle")
@@ -87,6 +111,7 @@ def plot_grouped_bar_count(df_pair, col_name, ref_group_label, comp_group_label,
     )
     return chart
 
+@timed()
 def plot_faceted_pie_charts(df_pair, col_name, ref_group_label, comp_group_label, group_col_for_plot, palette_config_value_ignored_for_slices):
     y_axis_title_cleaned = _get_cleaned_col_name(col_name)
     category_color_scheme = 'tableau20' # A broad scheme for categories within pies
@@ -98,11 +123,12 @@ def plot_faceted_pie_charts(df_pair, col_name, ref_group_label, comp_group_label
 
     # Determine the overall sort order of categories based on total counts across both groups
     # This helps in making the pie charts visually comparable if using the same color scheme for slices
-    category_order = df_pair[col_name].dropna().value_counts().index.tolist()
+    counts = _category_counts(df_pair, col_name, group_col_for_plot)
+    category_order = counts.groupby(col_name, observed=True)['count'].sum().sort_values(ascending=False, kind='stable').index.tolist()
 
     for i, group_label in enumerate([ref_group_label, comp_group_label]):
-        group_data = df_pair[df_pair[group_col_for_plot] == group_label].copy()
-        if group_data.empty or group_data[col_name].nunique() == 0:
+        group_data = counts[counts[group_col_for_plot] == group_label] # One row per category, percentage precomputed
+        if group_data.empty:
             empty_chart_text = f"No data for {group_label}"
             empty_chart = alt.Chart(pd.DataFrame({'text': [empty_chart_text]})).mark_text(size=14, align="center", baseline="middle").encode(
                 text='text:N'
@@ -110,13 +136,10 @@ def plot_faceted_pie_charts(df_pair, col_name, ref_group_label, comp_group_label
             pie_charts_list.append(empty_chart)
             continue
 
-        # Calculate percentage for labels within this group's data
-        group_data['percentage'] = group_data.groupby(col_name)[col_name].transform('count') / len(group_data) * 100
-
         pie_title_text = f"{group_label}: {y_axis_title_cleaned}"
 
         base = alt.Chart(group_data).encode(
-            theta=alt.Theta("count():Q", stack=True),
+            theta=alt.Theta("count:Q", stack=True),
             color=alt.Color(f"{col_name}:N",
                           scale=alt.Scale(scheme=category_color_scheme, domain=category_order), # Consistent color mapping
                           legend=alt.Legend(title=None, # Remove redundant legend title
@@ -126,7 +149,7 @@ def plot_faceted_pie_charts(df_pair, col_name, ref_group_label, comp_group_label
                          ),
             tooltip=[
                 alt.Tooltip(f"{col_name}:N", title=y_axis_title_cleaned),
-                alt.Tooltip("count():Q", title="N"),
+                alt.Tooltip("count:Q", title="N"),
                 alt.Tooltip("percentage:Q", title="%", format=".1f")
             ]
         ).properties(title=alt.TitleParams(text=pie_title_text, anchor="middle", dy=-15), width=chart_width, height=chart_height)
@@ -153,31 +176,152 @@ def plot_faceted_pie_charts(df_pair, col_name, ref_group_label, comp_group_label
         return alt.Chart().mark_text(text="Error generating pie charts.").to_dict()
 
 
+# --- SERVER-SIDE DENSITY / BINNING HELPERS ---
+# Numerical charts ship a few hundred precomputed points instead of every respondent's value,
+# so the spec size (and browser work) no longer grows with the number of respondents.
+
+KDE_STEPS = 200 # Output points per group curve (same as the former transform_density steps)
+KDE_GRID_SIZE = 1024 # Internal binning grid for the FFT convolution
+
+def _numeric_values(series):
+    values = series.to_numpy(dtype='float64', na_value=np.nan)
+    return values[~np.isnan(values)]
+
+def _kde_bandwidth(values, bandwidth='scott', bandwidth_adjust=1.0):
+    """
+    Gaussian kernel bandwidth. 'scott' is Vega's transform_density default (1.06 * min(sd, IQR/1.34) * n^-1/5),
+    'silverman' uses 0.9 instead of 1.06; a number is taken as the bandwidth in data units.
+    """
+    if isinstance(bandwidth, (int, float)) and not isinstance(bandwidth, bool):
+        bw = float(bandwidth)
+    else:
+        factor = {'scott': 1.06, 'silverman': 0.9}[bandwidth]
+        n = len(values)
+        q1, q3 = np.percentile(values, [25, 75])
+        spread = min(np.std(values, ddof=1) if n > 1 else 0.0, (q3 - q1) / 1.34)
+        bw = factor * spread * n ** -0.2
+        if not bw > 0: # Constant or near-constant data: fall back to a small positive bandwidth
+            bw = max(abs(float(np.mean(values))) * 1e-3, 1e-3) if n else 1.0
+    return bw * bandwidth_adjust
+
+def _binned_kde(values, extent, bandwidth, steps=KDE_STEPS, grid_size=KDE_GRID_SIZE):
+    """Binned Gaussian KDE (linear binning + FFT convolution), evaluated at `steps` points across `extent`."""
+    lo, hi = extent
+    grid = np.linspace(lo, hi, grid_size)
+    dx = grid[1] - grid[0]
+    # Linear binning: split each observation's weight between its two neighbouring grid points
+    pos = np.clip((values - lo) / dx, 0, grid_size - 1)
+    left = np.minimum(np.floor(pos).astype(np.intp), grid_size - 2)
+    frac = pos - left
+    weights = np.bincount(left, 1 - frac, minlength=grid_size) + np.bincount(left + 1, frac, minlength=grid_size)
+
+    offsets = np.arange(-(grid_size - 1), grid_size) * dx
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+    fft_size = 1 << int(np.ceil(np.log2(len(weights) + len(kernel) - 1)))
+    smoothed = np.fft.irfft(np.fft.rfft(weights, fft_size) * np.fft.rfft(kernel, fft_size), fft_size)
+    density = np.maximum(smoothed[grid_size - 1: 2 * grid_size - 1], 0) / len(values)
+
+    x_out = np.linspace(lo, hi, steps)
+    return x_out, np.interp(x_out, grid, density)
+
+@timed()
+def _density_curves(df_pair, col_name, group_col, steps=KDE_STEPS, bandwidth='scott', bandwidth_adjust=1.0):
+    """
+    Long frame of KDE curves (`value`, `density`) per group over the shared data extent, plus the
+    per-group mean/median/N used by tooltips.
+    """
+    all_values = _numeric_values(df_pair[col_name])
+    if len(all_values) == 0:
+        return pd.DataFrame(columns=[group_col, 'value', 'density', 'group_mean', 'group_median', 'group_n'])
+    lo, hi = float(all_values.min()), float(all_values.max())
+    if lo == hi:
+        lo, hi = lo - 0.5, hi + 0.5
+
+    curves = []
+    for group_label, group_series in df_pair.groupby(group_col, observed=True)[col_name]:
+        values = _numeric_values(group_series)
+        if len(values) == 0:
+            continue
+        bw = _kde_bandwidth(values, bandwidth, bandwidth_adjust)
+        x_out, density = _binned_kde(values, (lo, hi), bw, steps=steps)
+        curves.append(pd.DataFrame({
+            group_col: group_label, 'value': x_out.round(6), 'density': density.round(8), # Rounded to keep the spec compact
+            'group_mean': values.mean(), 'group_median': np.median(values), 'group_n': len(values),
+        }))
+    return pd.concat(curves, ignore_index=True)
+
+def _nice_bins(lo, hi, maxbins):
+    """Bin start/stop/step chosen the way Vega-Lite's `bin` transform does for `maxbins`."""
+    span = (hi - lo) or abs(lo) or 1
+    level = np.ceil(np.log(maxbins) / np.log(10))
+    step = 10 ** (np.round(np.log10(span)) - level)
+    while np.ceil(span / step) > maxbins:
+        step *= 10
+    for divisor in (5, 2):
+        if span / (step / divisor) <= maxbins:
+            step /= divisor
+    precision = 0 if np.log(step) >= 0 else int(-np.log(step) / np.log(10)) + 1
+    eps = 10 ** (-precision - 1)
+    start = np.floor(lo / step + eps) * step
+    start = start - step if lo < start else start
+    stop = np.ceil(hi / step) * step
+    return start, (stop if stop != start else start + step), step
+
+@timed()
+def _histogram_counts(df_pair, col_name, group_col, maxbins=25):
+    """Per-group counts over shared nice bins; only non-empty bins are returned (as Vega would)."""
+    all_values = _numeric_values(df_pair[col_name])
+    columns = [group_col, 'bin_start', 'bin_end', 'bin_range', 'count']
+    if len(all_values) == 0:
+        return pd.DataFrame(columns=columns)
+    start, stop, step = _nice_bins(all_values.min(), all_values.max(), maxbins)
+    n_bins = int(round((stop - start) / step))
+
+    frames = []
+    for group_label, group_series in df_pair.groupby(group_col, observed=True)[col_name]:
+        values = _numeric_values(group_series)
+        bin_idx = np.clip(np.floor(1e-14 + (values - start) / step).astype(np.intp), 0, n_bins - 1)
+        counts = np.bincount(bin_idx, minlength=n_bins)
+        occupied = np.flatnonzero(counts)
+        bin_start = start + occupied * step
+        frames.append(pd.DataFrame({
+            group_col: group_label, 'bin_start': bin_start, 'bin_end': bin_start + step,
+            'bin_range': [f"{b:g} – {b + step:g}" for b in bin_start], 'count': counts[occupied],
+        }))
+    return pd.concat(frames, ignore_index=True)[columns]
+
+
 # --- NUMERICAL PLOT FUNCTIONS ---
-def plot_density_boxplot(df_pair, col_name, ref_group_label, comp_group_label, group_col_for_plot, palette_config_value, opacity=0.55):
+@timed()
+def plot_density_boxplot(df_pair, col_name, ref_group_label, comp_group_label, group_col_for_plot, palette_config_value, opacity=0.55, boxplot_stats=None,
+                         bandwidth='scott', bandwidth_adjust=1.0):
+    return plot_groups_density_boxplot(df_pair, col_name, [ref_group_label, comp_group_label], group_col_for_plot, palette_config_value, opacity,
+                                       boxplot_stats=boxplot_stats, bandwidth=bandwidth, bandwidth_adjust=bandwidth_adjust)
+
+@timed()
+def plot_groups_density_boxplot(df_groups, col_name, group_labels, group_col_for_plot, palette_config_value, opacity=0.55, boxplot_stats=None,
+                                bandwidth='scott', bandwidth_adjust=1.0):
+    """Overlaid density curves above one box plot per group, for any number of groups."""
     x_axis_title = _get_cleaned_col_name(col_name)
-    chart_title = f"{ref_group_label} vs {comp_group_label}: {x_axis_title} Distribution"
-    current_groups_in_df = df_pair[group_col_for_plot].unique()
+    chart_title = f"{' vs '.join(group_labels)}: {x_axis_title} Distribution"
+    current_groups_in_df = df_groups[group_col_for_plot].unique()
     color_scale = _create_color_scale(current_groups_in_df, palette_config_value)
 
-    density_plot = alt.Chart(df_pair).transform_density(
-        density=col_name,
-        groupby=[group_col_for_plot],
-        steps=200,
-        extent=[df_pair[col_name].min(), df_pair[col_name].max()]
-    ).mark_area(opacity=opacity, line={'color': 'grey', 'width': 0.7}).encode(
+    density_df = _density_curves(df_groups, col_name, group_col_for_plot, bandwidth=bandwidth, bandwidth_adjust=bandwidth_adjust)
+    density_plot = alt.Chart(density_df).mark_area(opacity=opacity, line={'color': 'grey', 'width': 0.7}).encode(
         alt.X('value:Q', title=x_axis_title, scale=alt.Scale(zero=False)),
         alt.Y('density:Q', title='Density', axis=alt.Axis(format='.1%')),
         alt.Color(f'{group_col_for_plot}:N', scale=color_scale, legend=alt.Legend(title="User Group", orient="top-right")), # Legend top-right
         tooltip=[
             alt.Tooltip(f'{group_col_for_plot}:N', title='Group'),
-            alt.Tooltip(f'mean({col_name})', title=f'Overall Mean', format='.1f'),
-            alt.Tooltip(f'median({col_name})', title=f'Overall Median', format='.1f'),
-            alt.Tooltip(f'count({col_name})', title=f'N (in group)')
+            alt.Tooltip('group_mean:Q', title=f'Overall Mean', format='.1f'),
+            alt.Tooltip('group_median:Q', title=f'Overall Median', format='.1f'),
+            alt.Tooltip('group_n:Q', title=f'N (in group)')
         ]
     ).properties(height=300)
 
-    boxplot_summary_df = _calculate_boxplot_stats(df_pair, group_col_for_plot, col_name)
+    # `boxplot_stats` (same layout as _calculate_boxplot_stats) can come precomputed, e.g. from the aggregate cube or `grouped_stats`
+    boxplot_summary_df = boxplot_stats if boxplot_stats is not None else _calculate_boxplot_stats(df_groups, group_col_for_plot, col_name)
     base_box = alt.Chart(boxplot_summary_df).encode(
         y=alt.Y(f'{group_col_for_plot}:N', title=None, axis=alt.Axis(labels=False, ticks=False, domain=False)),
         color=alt.Color(f'{group_col_for_plot}:N', scale=color_scale, legend=None),
@@ -198,36 +342,43 @@ def plot_density_boxplot(df_pair, col_name, ref_group_label, comp_group_label, g
     median_tick = base_box.mark_tick(color='white', size=23, thickness=3, opacity=1).encode(x='median:Q') # Ensure median visible
     lower_whisker = base_box.mark_rule(stroke='black', strokeWidth=1).encode(x='min_val:Q', x2='q1:Q')
     upper_whisker = base_box.mark_rule(stroke='black', strokeWidth=1).encode(x='q3:Q', x2='max_val:Q')
-    constructed_box_plot = alt.layer(lower_whisker, upper_whisker, box, median_tick).properties(height=70)
+    constructed_box_plot = alt.layer(lower_whisker, upper_whisker, box, median_tick).properties(height=max(70, 30 * len(boxplot_summary_df))) # Room for each group's box
 
     return alt.vconcat(density_plot, constructed_box_plot, spacing=-5).properties( # Reduced spacing
         title=alt.TitleParams(text=chart_title, anchor="middle")
     ).resolve_scale(x='shared')
 
+@timed()
 def _calculate_boxplot_stats(df, group_col, value_col):
-    return df.groupby(group_col)[value_col].agg(
-        min_val='min', q1=lambda x: x.quantile(0.25), median='median',
-        q3=lambda x: x.quantile(0.75), max_val='max', count='count'
-    ).reset_index()
+    return grouped_stats(df, value_col, group_col).boxplot_frame(group_col)
 
+@timed()
 def plot_overlapping_histogram_count(df_pair, col_name, ref_group_label, comp_group_label, group_col_for_plot, palette_config_value, opacity=0.6):
     x_axis_title = _get_cleaned_col_name(col_name)
     chart_title = f"{ref_group_label} vs {comp_group_label}: {x_axis_title} (Counts)"
     color_scale = _create_color_scale([ref_group_label, comp_group_label], palette_config_value)
-    chart = alt.Chart(df_pair).mark_bar(binSpacing=0.5, opacity=opacity, cornerRadiusTopLeft=2, cornerRadiusTopRight=2).encode(
-        alt.X(f"{col_name}:Q", bin=alt.Bin(maxbins=25), title=x_axis_title),
-        alt.Y('count()', stack=None, title='Number of Respondents'),
+    histogram_df = _histogram_counts(df_pair, col_name, group_col_for_plot, maxbins=25)
+    chart = alt.Chart(histogram_df).mark_bar(binSpacing=0.5, opacity=opacity, cornerRadiusTopLeft=2, cornerRadiusTopRight=2).encode(
+        alt.X('bin_start:Q', bin='binned', title=x_axis_title),
+        alt.X2('bin_end:Q'),
+        alt.Y('count:Q', stack=None, title='Number of Respondents'),
         alt.Color(f'{group_col_for_plot}:N', scale=color_scale, legend=alt.Legend(title="User Group", orient="top-left")),
-        order=alt.Order('count()', sort='descending'), # Attempt to draw larger group first
-        tooltip=[alt.Tooltip(f"{col_name}:Q", bin=True, title=x_axis_title), alt.Tooltip('count()', title='Count in Bin'), f'{group_col_for_plot}:N']
+        order=alt.Order('count:Q', sort='descending'), # Attempt to draw larger group first
+        tooltip=[alt.Tooltip('bin_range:N', title=x_axis_title), alt.Tooltip('count:Q', title='Count in Bin'), f'{group_col_for_plot}:N']
     ).properties(title=alt.TitleParams(text=chart_title, anchor="middle"))
     return chart
 
-def plot_side_by_side_boxplot(df_pair, col_name, ref_group_label, comp_group_label, group_col_for_plot, palette_config_value):
+@timed()
+def plot_side_by_side_boxplot(df_pair, col_name, ref_group_label, comp_group_label, group_col_for_plot, palette_config_value, boxplot_stats=None):
+    return plot_groups_boxplot(df_pair, col_name, [ref_group_label, comp_group_label], group_col_for_plot, palette_config_value, boxplot_stats=boxplot_stats)
+
+@timed()
+def plot_groups_boxplot(df_groups, col_name, group_labels, group_col_for_plot, palette_config_value, boxplot_stats=None):
+    """One box plot per group, for any number of groups."""
     x_axis_title = _get_cleaned_col_name(col_name)
-    chart_title = f"{ref_group_label} vs {comp_group_label}: {x_axis_title} (Box Plots)"
-    color_scale = _create_color_scale([ref_group_label, comp_group_label], palette_config_value)
-    boxplot_summary_df = _calculate_boxplot_stats(df_pair, group_col_for_plot, col_name)
+    chart_title = f"{' vs '.join(group_labels)}: {x_axis_title} (Box Plots)"
+    color_scale = _create_color_scale(group_labels, palette_config_value)
+    boxplot_summary_df = boxplot_stats if boxplot_stats is not None else _calculate_boxplot_stats(df_groups, group_col_for_plot, col_name)
     base_box = alt.Chart(boxplot_summary_df).encode(
         y=alt.Y(f'{group_col_for_plot}:N', title=None, axis=alt.Axis(labels=True, domain=False, ticks=False, title=None, labelPadding=5)),
         color=alt.Color(f'{group_col_for_plot}:N', scale=color_scale, legend=None),
@@ -238,4 +389,20 @@ def plot_side_by_side_boxplot(df_pair, col_name, ref_group_label, comp_group_lab
     lower_whisker = base_box.mark_rule(stroke='black', strokeWidth=1).encode(x='min_val:Q', x2='q1:Q')
     upper_whisker = base_box.mark_rule(stroke='black', strokeWidth=1).encode(x='q3:Q', x2='max_val:Q')
     chart = alt.layer(lower_whisker, upper_whisker, box, median_tick).properties(title=alt.TitleParams(text=chart_title, anchor="middle"))
-    return chart
\ No newline at end of file
+    return chart
+
+
+# --- RENDERING (Streamlit pages) ---
+
+def chart_spec(chart):
+    """The Vega-Lite spec of an Altair chart (None stays None), so the memo keeps specs rather than chart objects."""
+    if chart is None:
+        return None
+    with span('chart_to_dict'):
+        return chart.to_dict()
+
+def render_chart(spec):
+    """Draws a memoized Vega-Lite spec (see `chart_spec`) on the current page."""
+    import streamlit as st # Only pages render; the headless report imports this module without Streamlit
+    with span('st.vega_lite_chart'):
+        st.vega_lite_chart(spec, use_container_width=True) # Let Streamlit handle width
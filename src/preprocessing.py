@@ -1,4 +1,12 @@
 # src/preprocessing.py
+import argparse
+import ast
+import hashlib
+import inspect
+import io
+import json
+import os
+import re
 import pandas as pd
 import numpy as np
 import sys
@@ -32,105 +40,926 @@ def clean_value(value):
     return value # Return original if not str/int/float
 
 
-def preprocess_data(raw_path, processed_path):
-    """Loads raw CSV, performs cleaning and type conversions, saves as Parquet."""
+NUMERIC_NA_TOKENS = ['n/a', 'na', 'unknown', '', 'none', 'not applicable', 'prefer not to say'] # As in clean_value
+
+PLAIN_NUMBER_PATTERN = r'[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:e[+-]?[0-9]+)?'
+
+def _parse_numeric_strings(values):
+    """Vectorized `clean_value` for an object array of strings; returns float64 (NaN where clean_value gives no number)."""
+    text = pd.Series(values, dtype=object).str.strip().str.lower()
+    result = np.full(len(text), np.nan)
+
+    def _digits_without(char):
+        return (text.str.contains(char, regex=False) & text.str.replace(char, '', regex=False).str.fullmatch('[0-9]+')).to_numpy(dtype=bool)
+
+    # Same precedence as clean_value: NA tokens, ranges ('5-10' -> 7.5), '>N' -> N+1, '<N' -> N-1, plain numbers
+    is_na_token = text.isin(NUMERIC_NA_TOKENS).to_numpy()
+    is_range = _digits_without('-') & ~is_na_token
+    is_above = _digits_without('>') & ~is_na_token & ~is_range
+    is_below = _digits_without('<') & ~is_na_token & ~is_range & ~is_above
+    is_plain = text.str.fullmatch(PLAIN_NUMBER_PATTERN).to_numpy(dtype=bool) & ~(is_na_token | is_range | is_above | is_below)
+
+    if is_range.any(): # Mean of the first two parts; an empty part (e.g. '-5') is invalid -> NaN
+        parts = text[is_range].str.split('-', n=2, expand=True)
+        low = parts[0].replace('', None).astype('float64').to_numpy()
+        high = parts[1].replace('', None).astype('float64').to_numpy()
+        result[is_range] = (low + high) / 2
+    for is_bound, char, offset in ((is_above, '>', 1), (is_below, '<', -1)):
+        if is_bound.any():
+            result[is_bound] = text[is_bound].str.replace(char, '', regex=False).astype('float64').to_numpy() + offset
+    if is_plain.any(): # astype(float) parses exactly like float(), unlike pandas' fast C parser
+        result[is_plain] = text[is_plain].astype('float64').to_numpy()
+
+    # Anything the patterns above do not cover ('many', '1_000', 'inf', non-ASCII digits, ...) gets the
+    # scalar rules, so every input still parses exactly as before
+    unresolved = ~(is_na_token | is_range | is_above | is_below | is_plain)
+    if unresolved.any():
+        result[unresolved] = pd.to_numeric(pd.Series([clean_value(v) for v in values[unresolved]], dtype=object), errors='coerce')
+    return result
+
+def clean_numeric_series(series):
+    """
+    Column-wide equivalent of `series.apply(clean_value)` followed by `pd.to_numeric(errors='coerce')`.
+    Strings are factorized first, so the parse runs once per distinct answer rather than once per cell.
+    """
+    if not _is_text_dtype(series):
+        return pd.to_numeric(series, errors='coerce') # clean_value passes non-strings through unchanged
+    if pd.api.types.infer_dtype(series, skipna=True) in ('string', 'empty'):
+        result = np.full(len(series), np.nan)
+        codes, uniques = pd.factorize(series) # NA -> -1
+        if len(uniques):
+            parsed = _parse_numeric_strings(np.asarray(uniques, dtype=object))
+            result[codes >= 0] = parsed[codes[codes >= 0]]
+        return pd.Series(result, index=series.index, name=series.name)
+    # Mixed object column: strings are parsed as above, anything else passes through to to_numeric
+    is_str = series.map(lambda value: isinstance(value, str)).to_numpy(dtype=bool)
+    result = pd.to_numeric(series.where(~is_str), errors='coerce').to_numpy(dtype='float64', copy=True)
+    result[is_str] = clean_numeric_series(series[is_str].astype(object)).to_numpy()
+    return pd.Series(result, index=series.index, name=series.name)
+
+def check_numeric_parser_equivalence(series):
+    """Values where `clean_numeric_series` disagrees with `clean_value` (empty when equivalent)."""
+    expected = pd.to_numeric(series.apply(clean_value), errors='coerce').astype('float64')
+    actual = clean_numeric_series(series).astype('float64')
+    same = (expected == actual) | (expected.isna() & actual.isna())
+    return pd.DataFrame({'value': series[~same], 'clean_value': expected[~same], 'vectorized': actual[~same]})
+
+NUMERIC_PARSER_EDGE_CASES = [
+    '5', ' 12 ', '3.5', '5-10', '10-20-30', '5-10-', '-5', '5-', '--', '-', '>100', '100>', '>>5', '<5', '<<', '>5-10',
+    '1e2', '1e-5', '-5.0', '+7', '.5', 'inf', 'nan', '1_000', '1,000', 'N/A', 'NA', 'Unknown', '', 'None', 'Not applicable',
+    'Prefer not to say', 'many', '²', '٣', '3-٣', None, np.nan,
+]
+
+# Raw times-used answers and the float each must parse to (NaN: no usable count)
+NUMERIC_PARSER_FIXTURE = {
+    '5': 5.0, ' 12 ': 12.0, '3.5': 3.5, '5-10': 7.5, '10-20-30': 15.0, '>100': 101.0, '100>': 101.0, '<5': 4.0,
+    '1e2': 100.0, '+7': 7.0, '.5': 0.5, '-5': np.nan, '1,000': np.nan, 'N/A': np.nan, 'NA': np.nan, 'Unknown': np.nan,
+    '': np.nan, 'Prefer not to say': np.nan, 'many': np.nan,
+}
+
+def verify_numeric_parser(raw_path=None):
+    """
+    Checks the vectorized parser against the known outputs of `NUMERIC_PARSER_FIXTURE`, then against
+    `clean_value` on the edge cases above and, if `raw_path` exists, on every times-used column of
+    the raw CSV. Prints mismatches; returns True if none.
+    """
+    fixture = pd.Series(list(NUMERIC_PARSER_FIXTURE), dtype=object)
+    expected = np.array(list(NUMERIC_PARSER_FIXTURE.values()), dtype='float64')
+    actual = clean_numeric_series(fixture).to_numpy(dtype='float64')
+    wrong = ~((expected == actual) | (np.isnan(expected) & np.isnan(actual)))
+    fixture_ok = not wrong.any()
+    if not fixture_ok:
+        print(f"Numeric parser gives unexpected values:\n{pd.DataFrame({'value': fixture[wrong], 'expected': expected[wrong], 'vectorized': actual[wrong]}).to_string()}")
+    samples = {'edge cases': pd.Series(NUMERIC_PARSER_EDGE_CASES, dtype=object)}
+    try:
+        raw = pd.read_csv(raw_path, usecols=lambda c: c.startswith(TIMES_USED_PREFIX), **RAW_CSV_READ_KWARGS) if raw_path else None
+    except FileNotFoundError:
+        raw = None
+    if raw is not None:
+        samples.update({col: raw[col] for col in raw.columns})
+    ok = True
+    for name, series in samples.items():
+        mismatches = check_numeric_parser_equivalence(series)
+        if not mismatches.empty:
+            ok = False
+            print(f"Numeric parser mismatch in {name}:\n{mismatches.to_string()}")
+    print(f"Numeric parser {'gives' if fixture_ok else 'DOES NOT give'} the expected values on {len(NUMERIC_PARSER_FIXTURE)} fixture answers.")
+    print(f"Numeric parser {'matches' if ok else 'DOES NOT match'} clean_value on {len(samples)} samples.")
+    return fixture_ok and ok
+
+# (raw checkbox column, answer, option slugs the answer must decode to -- and no others)
+MULTI_SELECT_DECODER_CASES = [
+    ('q4_racial_or_ethnic_background', "['Caucasian / European', 'Oceanian (e.g., Australia, New Zealand, surrounding islands)']", ('caucasian', 'oceanian')),
+    ('q4_racial_or_ethnic_background', "['Black/African diaspora (e.g., African-American, Caribbean)']", ('black',)),
+    ('q4_racial_or_ethnic_background', "['Another background']", ()),
+    ('q4_racial_or_ethnic_background', "['South East Asian', 'South Asian']", ('south_east_asian', 'south_asian')),
+    ('q4_racial_or_ethnic_background', "['Caucasian / EuropeanIndigenous (e.g., Native American, First Nations)']", ('caucasian', 'indigenous')),
+    ('q4_racial_or_ethnic_background', "['Caucasian / Europeanother']", ('caucasian', 'other')),
+    ('q30a_hallucination_substances', "['LSD / Acid', 'Ketamine (K)', 'DMT/5-MeO-DMT']", ('lsd', 'ketamine', 'dmt')),
+    ('q39_test_kit_service', "['At home test kitotherLab-based testing service']", ('home_kit', 'other', 'lab')),
+    ('q39_test_kit_service', "['Another background']", ()),
+    ('q4_racial_or_ethnic_background', "['Caucasian / European', 'some other heritage']", ('caucasian',)),
+    ('q4_racial_or_ethnic_background', "['Caucasian / European', 'other']", ('caucasian', 'other')),
+    ('q16_reasons_to_use', "['Recreational (e.g., for fun, social connectedness, euphoria)', 'none of the above']", ('recreational',)),
+    ('q30a_hallucination_substances', "['none']", ('none',)),
+]
+
+def verify_multi_select_decoder():
+    """Checks `decode_multi_select` on the cases above. Prints mismatches; returns True if none."""
+    ok = True
+    for col, answer, expected in MULTI_SELECT_DECODER_CASES:
+        _prefix, options = CHECKBOX_QUESTIONS[col]
+        catch_alls = [label for label in options.values() if label in CHECKBOX_CATCH_ALL_LABELS]
+        decoded = decode_multi_select(pd.Series([answer], dtype=object), list(options.values()), catch_alls)[0]
+        ticked = {slug for slug, hit in zip(options, decoded) if hit}
+        if ticked != set(expected):
+            ok = False
+            print(f"Multi-select decoder mismatch in {col} for {answer!r}: {sorted(ticked)} (expected {sorted(expected)})")
+    print(f"Multi-select decoder {'passes' if ok else 'FAILS'} {len(MULTI_SELECT_DECODER_CASES)} cases.")
+    return ok
+
+# --- Cleaning Rules ---
+RAW_CSV_READ_KWARGS = dict(sep=',', encoding='latin1', on_bad_lines='skip') # Load with latin1, skip bad lines
+
+YES_NO_PREFIXES = ('q11_', 'q12_', 'q18_', 'q19_', 'q57_', 'q73_', 'q75_', 'q98_') # Add other prefixes
+YES_NO_MAP = {'Yes': True, 'No': False, 'Maybe': np.nan, '': np.nan, 'Unknown':np.nan, 'Prefer not to say': np.nan}
+
+CATEGORICAL_DEMOGRAPHICS = ['q1_gender', 'q3_relationship_status', 'q7_current_living_arrangement',
+                            'q8_education_level', 'q9_employment_status', 'q10_household_income_category']
+
+# Checkbox (multi-select) questions: {raw column: (output prefix, {option slug: option label})}.
+# Each ticked option becomes a bool column `<prefix>_<slug>`. Labels are the survey's option texts
+# without their "(e.g., ...)" examples; add a question here to decode it (the decoder is generic).
+# Catch-all options (CHECKBOX_CATCH_ALL_LABELS) are common words, so they count only as whole list
+# items, never when they appear inside another item's text.
+CHECKBOX_QUESTIONS = {
+    'q4_racial_or_ethnic_background': ('q4_race', {
+        'african': 'African', 'black': 'Black / African diaspora', 'caucasian': 'Caucasian / European',
+        'east_asian': 'East Asian', 'indigenous': 'Indigenous', 'latin': 'Latin, Hispanic, Central and South American',
+        'oceanian': 'Oceanian', 'south_asian': 'South Asian', 'south_east_asian': 'South East Asian',
+        'west_asian': 'West Central Asian, Middle Eastern and North African', 'prefer_not_to_say': 'Prefer not to say',
+        'other': 'other',
+    }),
+    'q16_reasons_to_use': ('q16_reason', {
+        'medical': 'To treat a medical condition', 'well_being': 'General well-being',
+        'personal_growth': 'Personal growth / self-exploration', 'spiritual': 'Religious / spiritual development',
+        'recreational': 'Recreational', 'reduce_substance_use': 'To reduce my use of another substance', 'none': 'none',
+    }),
+    'q17b_psychedelic_source': ('q17b_source', {
+        'friend': 'I received them from a friend / acquaintance', 'dealer': 'I bought them from a dealer',
+        'self_produced': 'I produced and / or harvested them myself', 'shaman': 'I accessed them via shaman, curandero or spiritual leader',
+        'online_store': 'I bought them through an online store / retailer',
+        'underground_therapist': 'I accessed them via an underground therapist / practitioner',
+        'dispensary': 'I bought them in-person at a retail dispensary',
+        'clinic': 'I accessed them via a clinic and / or a health care professional',
+        'pharmacy': 'I bought or receive them from a pharmacy', 'none': 'none',
+    }),
+    'q26_how_changed_music_relationship': ('q26_music', {
+        'more_enjoyment': 'Increased my enjoyment of music in general', 'less_enjoyment': 'Decreased my enjoyment of music in general',
+        'more_genre_enjoyment': 'Increased my enjoyment of specific genres of music',
+        'less_genre_enjoyment': 'Decreased my enjoyment of specific genres of music',
+        'more_importance': 'Increased the importance of music in my life', 'less_importance': 'Decreased the importance of music in my life',
+        'more_creating': 'Increased my desire to create music', 'less_creating': 'Decreased my desire to create music',
+    }),
+    'q30a_hallucination_substances': ('q30a_hallucination', {
+        '2cb': '2C-B', 'ayahuasca': 'Ayahuasca', 'dmt': 'DMT / 5-MeO-DMT', 'ibogaine': 'Iboga / Ibogaine', 'ketamine': 'Ketamine',
+        'lsd': 'LSD/Acid', 'mdma': 'MDMA / MDA', 'mescaline': 'Mescaline', 'nitrous': 'Nitrous Oxide', 'psilocybin': 'Psilocybin',
+        'salvia': 'Salvia Divinorum', 'none': 'none',
+    }),
+    'q39_test_kit_service': ('q39_testing', {
+        'home_kit': 'At home test kit', 'lab': 'Lab-based testing service', 'event': 'Testing service at event',
+        'dealer_tests': 'My dealer, therapist or shaman tests psychedelics before use', 'other': 'other',
+    }),
+}
+
+CHECKBOX_CATCH_ALL_LABELS = ('other', 'none')
+
+# Numerical Ratings (e.g., 0-100)
+RATING_COLS = ['q14_knowledge_ranking', 'q15_experience_ranking', 'q46_positive_experience_rating',
+               'q93_tbi_rate_relief', 'q96_adhd_rate_relief'] # Add others if needed
+
+# Example: GAD/PHQ (0, 1, 2, 3) - Check actual values in CSV!
+GAD_PHQ_PREFIXES = ('q79','q80')
+LIKERT_MAP_GAD_PHQ = {'Not at all': 0, 'Several days': 1, 'More than half the days': 2, 'Nearly every day': 3}
+
+# Example: Agreement scales (Strongly disagree -> Strongly agree as 1-5 or 0-4)
+AGREEMENT_PREFIXES = ('q25','q36','q37','q41','q54') # Add others
+LIKERT_MAP_AGREEMENT = {'Strongly disagree': 1, 'Moderately disagree': 2, 'Somewhat disagree': 2, # Combine moderate/somewhat if needed
+                        'Neither agree nor disagree': 3, 'Neutral': 3,
+                        'Somewhat agree': 4, 'Moderately agree': 4, 'Strongly agree': 5}
+
+TIMES_USED_PREFIX = 'q18a_psychedelic_times_used.'
+
+
+def _is_text_dtype(series):
+    """True for raw text columns (object, or pandas' dedicated string dtype on newer pandas)."""
+    return pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+
+# --- Column Codecs ---
+# A codec decodes a set of raw columns in place. Code-mapping codecs decode all of their columns
+# together: each distinct answer across the columns is decoded once and every cell is then a lookup
+# by its factorized code, instead of a string replace/map per column.
+
+def _decode_block(df, cols, decode_uniques):
+    """
+    (rows x cols) float64 array of the text columns `cols` decoded together. Each column is factorized
+    natively, the per-column dictionaries are merged into one, and `decode_uniques` maps the distinct
+    answers of all the columns (an object array) to float64 once. Missing cells give NaN.
+    """
+    factorized = [pd.factorize(df[col]) for col in cols] # NA -> -1
+    all_uniques = [np.asarray(col_uniques, dtype=object) for _codes, col_uniques in factorized]
+    merged_codes, uniques = pd.factorize(np.concatenate(all_uniques) if all_uniques else np.array([], dtype=object))
+    decoded = np.append(decode_uniques(uniques), np.nan) # Code -1 (missing) gathers the trailing NaN
+    values, offset = np.empty((len(df), len(cols)), order='F'), 0
+    for i, (codes, col_uniques) in enumerate(factorized):
+        to_merged = np.append(merged_codes[offset:offset + len(col_uniques)], -1) # Column code -> merged code
+        values[:, i] = decoded[to_merged[codes]]
+        offset += len(col_uniques)
+    return values
+
+def _assign_block(df, cols, values, dtype):
+    """Writes decoded `values` (from `_decode_block`) back as nullable 'boolean'/'Int64' or float64 columns."""
+    missing = np.isnan(values)
+    for i, col in enumerate(cols):
+        if dtype == 'boolean':
+            df[col] = pd.arrays.BooleanArray(values[:, i] == 1, missing[:, i])
+        elif dtype == 'Int64':
+            df[col] = pd.arrays.IntegerArray(np.where(missing[:, i], 0, values[:, i]).astype('int64'), missing[:, i])
+        else:
+            df[col] = values[:, i]
+
+def _decode_boolean(df, cols, category_levels=None, verbose=True, mapping=None, strip=False):
+    # Unmapped answers become NA
+    cols = [col for col in cols if _is_text_dtype(df[col])]
+    def decode(uniques):
+        answers = pd.Series(uniques, dtype=object)
+        return (answers.str.strip() if strip else answers).map(mapping).to_numpy(dtype='float64', na_value=np.nan)
+    _assign_block(df, cols, _decode_block(df, cols, decode), 'boolean')
+
+def _decode_likert(df, cols, category_levels=None, verbose=True, mapping=None):
+    cols = [col for col in cols if _is_text_dtype(df[col])]
+    decode = lambda uniques: pd.Series(uniques, dtype=object).map(mapping).to_numpy(dtype='float64', na_value=np.nan)
+    _assign_block(df, cols, _decode_block(df, cols, decode), 'Int64') # Use nullable Int
+
+def _decode_numeric(df, cols, category_levels=None, verbose=True):
+    # Numeric columns pass through; text ones are parsed with to_numeric (unparseable -> NaN)
+    cols = [col for col in cols if _is_text_dtype(df[col])]
+    decode = lambda uniques: pd.to_numeric(pd.Series(uniques, dtype=object), errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    _assign_block(df, cols, _decode_block(df, cols, decode), 'float64')
+
+def _decode_numeric_ranges(df, cols, category_levels=None, verbose=True):
+    # Free-text counts such as '5-10', '>100' or 'N/A' (see clean_value)
+    text_cols = [col for col in cols if _is_text_dtype(df[col]) and pd.api.types.infer_dtype(df[col], skipna=True) in ('string', 'empty')]
+    _assign_block(df, text_cols, _decode_block(df, text_cols, _parse_numeric_strings), 'float64')
+    for col in cols:
+        if col not in text_cols: # Numeric or mixed-type columns
+            df[col] = clean_numeric_series(df[col])
+
+def _decode_category(df, cols, category_levels=None, verbose=True):
+    # Categories are per column; fixed by `category_levels` where given, so chunks share one dictionary
+    for col in cols:
+        if category_levels is not None and col in category_levels:
+            df[col] = pd.Categorical(df[col], categories=category_levels[col])
+        else:
+            df[col] = df[col].astype('category')
+
+def _normalize_option_text(text):
+    """Answer or option text with separators spaced alike ('LSD/Acid' -> 'LSD / Acid') and runs of whitespace collapsed."""
+    return re.sub(r"\s+", ' ', re.sub(r"\s*/\s*", ' / ', text)).strip()
+
+def _answer_items(answer):
+    """The ticked items of a raw answer: the strings of its list literal, or the whole answer if it is not one."""
+    text = str(answer).strip()
+    if text.startswith('['):
+        try:
+            items = ast.literal_eval(text)
+        except (ValueError, SyntaxError):
+            items = None
+        if isinstance(items, list):
+            return [_normalize_option_text(str(item)) for item in items]
+    return [_normalize_option_text(text)]
+
+def _labels_alternation(labels):
+    """Regex alternation of the (normalized) `labels`, longest first so a label never matches as a prefix of another."""
+    return '|'.join(re.escape(label) for label in sorted(labels, key=len, reverse=True))
+
+def _option_patterns(labels, scan_labels):
+    """
+    Two case-insensitive regexes: `item` matches one of `labels` at a position, with the "(e.g., ...)"
+    examples that follow it in the survey; `scan` finds `scan_labels` as whole words inside free text
+    (None if there are none).
+    """
+    item_pattern = re.compile(rf"({_labels_alternation(labels)})(?:\s*\([^()]*\))?\s*", re.IGNORECASE)
+    if not scan_labels:
+        return item_pattern, None
+    return item_pattern, re.compile(rf"(?<!\w)({_labels_alternation(scan_labels)})(?!\w)", re.IGNORECASE)
+
+def _item_options(item, item_pattern):
+    """The options an item consists of, run together (e.g. 'Caucasian / EuropeanIndigenous'), or None if it has other text."""
+    found, pos = [], 0
+    while pos < len(item):
+        match = item_pattern.match(item, pos)
+        if match is None:
+            return None
+        found.append(match.group(1))
+        pos = match.end()
+    return found
+
+def decode_multi_select(answers, labels, whole_item_labels=()):
+    """
+    Multi-hot (rows x options) bool matrix of a checkbox question: True where the row ticked the option.
+    Each distinct answer is decoded once and the decoded rows are gathered by the answers' codes, so the
+    cost is one pass over the column. An answer is split into its list items; an item is read as the
+    options it consists of (the export sometimes runs ticked options together), and only an item with
+    other text is scanned for options as whole words -- except `whole_item_labels` (catch-alls such as
+    'other'), which count only as list items of their own. Unanswered rows are all False.
+    """
+    codes, uniques = pd.factorize(answers)
+    whole_item_labels = {_normalize_option_text(label).lower() for label in whole_item_labels}
+    labels = [_normalize_option_text(label) for label in labels]
+    scan_labels = [label for label in labels if label.lower() not in whole_item_labels]
+    item_pattern, scan_pattern = _option_patterns(labels, scan_labels)
+    option_index = {label.lower(): i for i, label in enumerate(labels)}
+    decoded = np.zeros((len(uniques) + 1, len(labels)), dtype=bool) # Last row: unanswered (code -1)
+    for row, answer in enumerate(uniques):
+        for item in _answer_items(answer):
+            options = _item_options(item, item_pattern)
+            if options is None:
+                options = [match.group(1) for match in scan_pattern.finditer(item)] if scan_pattern else []
+            for option in options:
+                decoded[row, option_index[option.lower()]] = True
+    return decoded[codes]
+
+def _decode_checkboxes(df, cols, category_levels=None, verbose=True):
+    # The raw answer column stays as it is; the option columns are appended after it
+    for col in cols:
+        prefix, options = CHECKBOX_QUESTIONS[col]
+        if verbose: print(f"Decoding checkbox question {col} ({len(options)} options)...")
+        catch_alls = [label for label in options.values() if label in CHECKBOX_CATCH_ALL_LABELS]
+        multi_hot = decode_multi_select(df[col], list(options.values()), catch_alls)
+        for i, slug in enumerate(options):
+            df[f"{prefix}_{slug}"] = multi_hot[:, i]
+
+CODECS = {
+    'boolean': _decode_boolean, 'likert': _decode_likert, 'numeric': _decode_numeric,
+    'numeric_ranges': _decode_numeric_ranges, 'category': _decode_category, 'multi_select': _decode_checkboxes,
+}
+
+# --- Column Schema ---
+# (family name, codec, column patterns, codec options) in the order the serial path applies them.
+# Patterns select columns by exact name ('columns') and/or name prefix ('prefixes'). Each family
+# cleans only its own columns, in place, and never reads another family's, so families can run in
+# separate processes (see `clean_frame`) and be rebuilt on their own (see `preprocess_incremental`).
+COLUMN_SCHEMA = [
+    ('yes_no', 'boolean', {'prefixes': YES_NO_PREFIXES}, {'mapping': YES_NO_MAP, 'strip': True}),
+    ('demographics', 'category', {'columns': CATEGORICAL_DEMOGRAPHICS}, {}),
+    ('age', 'numeric', {'columns': ['q2_age']}, {}),
+    ('checkbox', 'multi_select', {'columns': list(CHECKBOX_QUESTIONS)}, {}),
+    ('ratings', 'numeric', {'columns': RATING_COLS}, {}), # Optional: clamp to the expected range (0-100)
+    ('gad_phq', 'likert', {'prefixes': GAD_PHQ_PREFIXES}, {'mapping': LIKERT_MAP_GAD_PHQ}),
+    ('agreement', 'likert', {'prefixes': AGREEMENT_PREFIXES}, {'mapping': LIKERT_MAP_AGREEMENT}),
+    ('times_used', 'numeric_ranges', {'prefixes': (TIMES_USED_PREFIX,)}, {}),
+]
+FAMILY_NAMES = [name for name, _codec, _patterns, _options in COLUMN_SCHEMA]
+
+FAMILY_BATCH_COLUMNS = 50 # Max columns per parallel task
+
+def family_columns(name, columns):
+    """The columns (in frame order) of family `name`."""
+    _name, _codec, patterns, _options = next(family for family in COLUMN_SCHEMA if family[0] == name)
+    names, prefixes = set(patterns.get('columns', ())), tuple(patterns.get('prefixes', ()))
+    return [col for col in columns if col in names or col.startswith(prefixes)]
+
+def clean_family(df, name, cols, category_levels=None, verbose=True):
+    """Decodes the columns `cols` of family `name` in place with the family's codec."""
+    _name, codec, _patterns, options = next(family for family in COLUMN_SCHEMA if family[0] == name)
+    if verbose and cols: print(f"Decoding {len(cols)} {name} column(s) ({codec})...")
+    CODECS[codec](df, cols, category_levels, verbose, **options)
+
+def _clean_family_part(df_part, family_name, category_levels=None, verbose=True):
+    """Worker entry point: cleans the columns of one family (or a batch of them) and returns the frame."""
+    clean_family(df_part, family_name, family_columns(family_name, df_part.columns), category_levels, verbose)
+    return df_part
+
+def _family_tasks(columns):
+    """
+    Splits the frame's columns into (family name, column batch) tasks for the process pool; large
+    families are cut into batches of `FAMILY_BATCH_COLUMNS`. Columns selected by more than one family
+    are returned separately and cleaned in the parent, so their families still apply in serial order.
+    """
+    family_cols = [(name, family_columns(name, columns)) for name in FAMILY_NAMES]
+    claims = pd.Series([col for _name, cols in family_cols for col in cols], dtype=object).value_counts()
+    shared = set(claims.index[claims > 1])
+    tasks = []
+    for name, cols in family_cols:
+        cols = [col for col in cols if col not in shared]
+        tasks += [(name, cols[i:i + FAMILY_BATCH_COLUMNS]) for i in range(0, len(cols), FAMILY_BATCH_COLUMNS)]
+    return tasks, [col for col in columns if col in shared]
+
+def clean_frame(df, category_levels=None, verbose=True, executor=None):
+    """
+    Applies all cleaning and type conversions to a raw frame (the whole file or one chunk of it).
+    `category_levels` fixes the categories of categorical columns, so chunks share one dictionary.
+    With a process pool `executor` (see `make_executor`), the column families are cleaned in
+    parallel and reassembled; the result is identical to the serial path.
+    """
+    # --- Basic Cleaning ---
+    # Drop potentially empty/unneeded rows/columns if identified
+    # df = df.dropna(how='all') # Example: drop rows where ALL columns are NA
+
+    if executor is None:
+        for name in FAMILY_NAMES:
+            clean_family(df, name, family_columns(name, df.columns), category_levels, verbose)
+        return df
+
+    tasks, shared_cols = _family_tasks(df.columns)
+    futures = [executor.submit(_clean_family_part, df[cols], name, category_levels, verbose) for name, cols in tasks]
+    parts = [future.result() for future in futures]
+    if shared_cols:
+        parts.append(clean_frame(df[shared_cols].copy(), category_levels, verbose))
+    # Cleaned columns take the raw ones' places; derived columns (checkbox options) are appended in family order
+    cleaned = {col: part[col] for part in parts for col in part.columns}
+    columns = [cleaned.get(col, df[col]) for col in df.columns] + [cleaned[col] for col in cleaned if col not in df.columns]
+    return pd.concat(columns, axis=1)
+
+def make_executor(workers):
+    """Process pool for `clean_frame`, or None for the serial path (`workers` of 1; 0 or None = all cores)."""
+    workers = workers or os.cpu_count()
+    if workers <= 1:
+        return None
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+# --- Compact dtypes ---
+# The processed file is stored with the smallest dtypes that hold each column exactly, so pages
+# load it as-is: small (nullable) integers for integral numbers such as ages, Likert items and
+# ratings, categoricals for low-cardinality text, and plain bools for yes/no columns without NAs.
+
+COMPACT_CATEGORY_MAX_LEVELS = 1000 # Text columns with at most this many distinct answers...
+COMPACT_CATEGORY_MAX_RATIO = 0.5 # ...and at most this many distinct answers per answered row become categoricals
+COMPACT_INT_DTYPES = ('int8', 'int16', 'int32')
+
+def _compact_dtype(series):
+    """Smallest dtype holding `series` exactly, or None to keep its current dtype."""
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return None
+    if pd.api.types.is_bool_dtype(dtype):
+        return np.dtype(bool) if isinstance(dtype, pd.BooleanDtype) and not series.isna().any() else None
+    if pd.api.types.is_numeric_dtype(dtype):
+        has_na = bool(series.isna().any())
+        values = series.to_numpy(dtype='float64', na_value=np.nan)
+        values = values[~np.isnan(values)]
+        if not (np.isfinite(values).all() and (values == np.round(values)).all()):
+            return None
+        low, high = (values.min(), values.max()) if values.size else (0, 0)
+        for name in COMPACT_INT_DTYPES:
+            if np.iinfo(name).min <= low and high <= np.iinfo(name).max:
+                return pd.api.types.pandas_dtype(name.capitalize()) if has_na else np.dtype(name)
+        return None
+    if _is_text_dtype(series):
+        answered = series.dropna()
+        if not answered.map(type).eq(str).all():
+            return None # Mixed-type columns stay as they are
+        levels = pd.unique(answered)
+        if len(levels) <= COMPACT_CATEGORY_MAX_LEVELS and len(levels) <= COMPACT_CATEGORY_MAX_RATIO * len(answered):
+            return pd.CategoricalDtype(sorted(levels)) # Sorted, as astype('category') would produce
+    return None
+
+def compact_plan(df):
+    """{column: compact dtype} for the columns of `df` that can be stored smaller."""
+    plan = {col: _compact_dtype(df[col]) for col in df.columns}
+    return {col: dtype for col, dtype in plan.items() if dtype is not None and dtype != df[col].dtype}
+
+def compact_frame(df, plan=None):
+    """`df` with the compact dtypes of `plan` (by default planned from `df` itself)."""
+    plan = compact_plan(df) if plan is None else plan
+    return df.astype({col: dtype for col, dtype in plan.items() if col in df.columns})
+
+def memory_report(bytes_before, bytes_after, dtypes_before, dtypes_after):
+    """Per-column memory (bytes) and dtypes before and after compaction, largest savings first."""
+    report = pd.DataFrame({
+        'dtype_before': dtypes_before.astype(str), 'dtype_after': dtypes_after.astype(str),
+        'bytes_before': bytes_before, 'bytes_after': bytes_after,
+    })
+    report['saved'] = report['bytes_before'] - report['bytes_after']
+    return report.sort_values('saved', ascending=False)
+
+def print_memory_report(report, top=30):
+    changed = report[report['dtype_before'] != report['dtype_after']]
+    print(f"\nMemory report ({len(changed)} of {len(report)} columns compacted; top {min(top, len(changed))} by savings):")
+    print(changed.head(top).to_string())
+    by_change = changed.groupby(['dtype_before', 'dtype_after'])[['bytes_before', 'bytes_after']].sum()
+    print(f"\nBy dtype change:\n{by_change.assign(columns=changed.groupby(['dtype_before', 'dtype_after']).size()).to_string()}")
+    before, after = report['bytes_before'].sum(), report['bytes_after'].sum()
+    print(f"\nIn-memory size: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB ({after / before:.0%})" if before else "")
+
+def _compact_parquet_file(source_path, processed_path, manifest):
+    """
+    Second streaming pass: plans compact dtypes one column at a time (from the uncompacted file),
+    then rewrites it row group by row group with those dtypes and the manifest.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    parquet_file = pq.ParquetFile(source_path)
+    plan = {}
+    for col in parquet_file.schema_arrow.names:
+        dtype = _compact_dtype(parquet_file.read(columns=[col]).to_pandas()[col])
+        if dtype is not None:
+            plan[col] = dtype
+
+    writer, schema, usage_before, usage_after, dtypes_before, dtypes_after = None, None, 0, 0, None, None
+    try:
+        for i in range(parquet_file.num_row_groups):
+            chunk = parquet_file.read_row_group(i).to_pandas()
+            compacted = compact_frame(chunk, plan)
+            usage_before = usage_before + chunk.memory_usage(deep=True, index=False)
+            usage_after = usage_after + compacted.memory_usage(deep=True, index=False)
+            if writer is None:
+                dtypes_before, dtypes_after = chunk.dtypes, compacted.dtypes
+                schema = _with_manifest(_arrow_schema(compacted), manifest)
+                writer = pq.ParquetWriter(processed_path, schema)
+            writer.write_table(pa.Table.from_pandas(compacted, schema=schema, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is not None:
+        print_memory_report(memory_report(usage_before, usage_after, dtypes_before, dtypes_after))
+
+
+def preprocess_data(raw_path, processed_path, chunksize=None, workers=1):
+    """
+    Loads raw CSV, performs cleaning and type conversions, saves as Parquet.
+    With `chunksize`, the CSV is streamed instead (see `preprocess_data_streaming`).
+    `workers` > 1 cleans the column families on a process pool (0 or None = all cores).
+    """
+    if chunksize:
+        return preprocess_data_streaming(raw_path, processed_path, chunksize, workers=workers)
     print(f"Starting preprocessing of {raw_path}...")
+    executor = make_executor(workers)
     try:
-        # Load with latin1, skip bad lines
-        df = pd.read_csv(raw_path, sep=',', encoding='latin1', on_bad_lines='skip', low_memory=False)
+        df = pd.read_csv(raw_path, **RAW_CSV_READ_KWARGS, low_memory=False)
         print(f"Loaded raw data: {df.shape}")
+        manifest = build_manifest(raw_path, {col: _merge_raw_kind(None, df[col].dtype) for col in df.columns}, len(df))
 
-        # --- Basic Cleaning ---
-        # Drop potentially empty/unneeded rows/columns if identified
-        # df = df.dropna(how='all') # Example: drop rows where ALL columns are NA
-
-        # Standardize Yes/No/Maybe answers (example - adjust based on actual values)
-        yes_no_cols = [col for col in df.columns if col.startswith(('q11_', 'q12_', 'q18_', 'q19_', 'q57_', 'q73_', 'q75_', 'q98_'))] # Add other prefixes
-        for col in yes_no_cols:
-            if df[col].dtype == 'object':
-                 df[col] = df[col].str.strip().replace({'Yes': True, 'No': False, 'Maybe': np.nan, '': np.nan, 'Unknown':np.nan, 'Prefer not to say': np.nan}).astype('boolean')
-
-
-        # --- Type Conversions & Specific Cleaning ---
-
-        # Demographics
-        if 'q2_age' in df.columns:
-            df['q2_age'] = pd.to_numeric(df['q2_age'], errors='coerce')
-        categorical_demographics = ['q1_gender', 'q3_relationship_status', 'q7_current_living_arrangement',
-                                    'q8_education_level', 'q9_employment_status', 'q10_household_income_category']
-        for col in categorical_demographics:
-            if col in df.columns:
-                 df[col] = df[col].astype('category')
-
-        # Handle q4_racial_or_ethnic_background (Checkbox example - assumes platform didn't split it)
-        # This might need significant adjustment depending on how the CSV stores checkbox results
-        if 'q4_racial_or_ethnic_background' in df.columns and df['q4_racial_or_ethnic_background'].dtype == 'object':
-            print("Processing Race/Ethnicity checkbox column...")
-            # Example: Split comma-separated values into boolean columns
-            # Define possible options based on the survey PDF
-            race_options = [
-                'African', 'Black / African diaspora', 'Caucasian / European', 'East Asian',
-                'Indigenous', 'Latin, Hispanic, Central and South American', 'Oceanian',
-                'South Asian', 'South East Asian', 'West Central Asian, Middle Eastern and North African',
-                'Prefer not to say'
-            ]
-            # Create boolean columns - this is a basic example, needs refinement based on data format
-            for option in race_options:
-                col_name = f"q4_race_{option.split(' ')[0].lower()}" # Create a shorter name
-                # Check if the option string exists in the comma-separated value (case-insensitive)
-                df[col_name] = df['q4_racial_or_ethnic_background'].str.contains(option.split('/')[0].strip(), case=False, na=False).astype('boolean')
-            # You might drop the original complex column afterwards
-            # df = df.drop(columns=['q4_racial_or_ethnic_background'])
-
-        # Numerical Ratings (e.g., 0-100)
-        rating_cols = ['q14_knowledge_ranking', 'q15_experience_ranking', 'q46_positive_experience_rating',
-                       'q93_tbi_rate_relief', 'q96_adhd_rate_relief'] # Add others if needed
-        for col in rating_cols:
-             if col in df.columns:
-                  df[col] = pd.to_numeric(df[col], errors='coerce')
-                  # Optional: Clamp values to expected range (0-100)
-                  # df[col] = df[col].clip(0, 100)
-
-        # Likert Scales (GAD, PHQ, Experience agreement, etc.) - Recode to numeric
-        # Example: GAD/PHQ (0, 1, 2, 3) - Check actual values in CSV!
-        likert_map_gad_phq = {'Not at all': 0, 'Several days': 1, 'More than half the days': 2, 'Nearly every day': 3}
-        gad_phq_cols = [col for col in df.columns if col.startswith(('q79','q80'))]
-        for col in gad_phq_cols:
-             if col in df.columns and df[col].dtype == 'object':
-                  df[col] = df[col].map(likert_map_gad_phq).astype('Int64') # Use nullable Int
-
-        # Example: Agreement scales (Strongly disagree -> Strongly agree as 1-5 or 0-4)
-        likert_map_agreement = {'Strongly disagree': 1, 'Moderately disagree': 2, 'Somewhat disagree': 2, # Combine moderate/somewhat if needed
-                                'Neither agree nor disagree': 3, 'Neutral': 3,
-                                'Somewhat agree': 4, 'Moderately agree': 4, 'Strongly agree': 5}
-        agreement_cols = [col for col in df.columns if col.startswith(('q25','q36','q37','q41','q54'))] # Add others
-        for col in agreement_cols:
-            if col in df.columns and df[col].dtype == 'object':
-                 df[col] = df[col].map(likert_map_agreement).astype('Int64')
-
-        # Clean specific problematic columns if identified (like q18a_ times used)
-        times_used_cols = [col for col in df.columns if col.startswith('q18a_psychedelic_times_used.')]
-        for col in times_used_cols:
-            if col in df.columns:
-                print(f"Cleaning times used: {col}")
-                df[col] = df[col].apply(clean_value)
-                # Optionally coerce errors again after custom cleaning
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-
+        df = clean_frame(df, executor=executor)
 
         # --- Final Check & Save ---
+        compacted = compact_frame(df)
+        print_memory_report(memory_report(df.memory_usage(deep=True, index=False), compacted.memory_usage(deep=True, index=False),
+                                          df.dtypes, compacted.dtypes))
+        df = compacted
+
         print(f"Preprocessing finished. Final shape: {df.shape}")
         print("\nSample of processed data types:")
         print(df.info()) # Print info to check types
 
-        df.to_parquet(processed_path, index=False)
+        write_processed(df, processed_path, manifest)
         print(f"Processed data saved to {processed_path}")
 
     except Exception as e:
         print(f"Error during preprocessing: {e}", file=sys.stderr)
         raise # Reraise the exception to stop if preprocessing fails
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+# --- Streaming (bounded-memory) preprocessing ---
+
+def _merge_raw_kind(kind, dtype):
+    """Unifies the dtype pandas inferred for a column across chunks ('bool' < 'int' < 'float' < 'object')."""
+    if pd.api.types.is_bool_dtype(dtype):
+        new_kind = 'bool'
+    elif pd.api.types.is_integer_dtype(dtype):
+        new_kind = 'int'
+    elif pd.api.types.is_float_dtype(dtype):
+        new_kind = 'float'
+    else:
+        new_kind = 'object'
+    if kind is None or kind == new_kind:
+        return new_kind
+    if {kind, new_kind} <= {'int', 'float'}:
+        return 'float'
+    return 'object'
+
+def _scan_raw_csv(raw_path, chunksize):
+    """
+    First streaming pass: the unified raw dtype of every column (so every chunk is parsed the same way
+    a whole-file read would) and the union of categories of each categorical column.
+    """
+    kinds, categories, n_rows = {}, {col: set() for col in CATEGORICAL_DEMOGRAPHICS}, 0
+    for chunk in pd.read_csv(raw_path, **RAW_CSV_READ_KWARGS, chunksize=chunksize):
+        n_rows += len(chunk)
+        for col in chunk.columns:
+            kinds[col] = _merge_raw_kind(kinds.get(col), chunk[col].dtype)
+        for col in CATEGORICAL_DEMOGRAPHICS:
+            if col in chunk.columns:
+                categories[col].update(chunk[col].dropna().unique().tolist())
+    # Sorted, as astype('category') on the whole column would produce
+    category_levels = {col: sorted(values) for col, values in categories.items()}
+    return kinds, category_levels, n_rows
+
+def _arrow_schema(first_chunk, raw_kinds=None):
+    """
+    Parquet schema for the streamed file; all-NA text columns in the first chunk are typed as strings.
+    With the full-file `raw_kinds`, raw text/float columns that cleaned to plain integers in the first
+    chunk (e.g. to_numeric on '30', '31') are typed float64, as a later chunk may hold '30.5' or NaN.
+    """
+    import pyarrow as pa
+    schema = pa.Schema.from_pandas(first_chunk, preserve_index=False)
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            schema = schema.set(i, field.with_type(pa.string()))
+        elif (raw_kinds is not None and raw_kinds.get(field.name) in ('float', 'object')
+              and isinstance(first_chunk[field.name].dtype, np.dtype) and first_chunk[field.name].dtype.kind in 'iu'):
+            schema = schema.set(i, field.with_type(pa.float64()))
+    return schema
+
+def preprocess_data_streaming(raw_path, processed_path, chunksize=50_000, workers=1):
+    """
+    Bounded-memory variant of `preprocess_data`: reads the raw CSV in chunks of `chunksize` rows,
+    applies the same cleaning to each chunk and appends it to the Parquet file as a row group.
+    Peak memory is a few chunks, independent of the input size.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    print(f"Starting streaming preprocessing of {raw_path} (chunksize={chunksize})...")
+    executor = make_executor(workers)
+    try:
+        kinds, category_levels, n_rows = _scan_raw_csv(raw_path, chunksize)
+        print(f"Scanned raw data: ({n_rows}, {len(kinds)})")
+        manifest = build_manifest(raw_path, kinds, n_rows)
+        # Force columns whose inferred type differs between chunks to their unified type
+        read_dtypes = {col: ('float64' if kind == 'float' else 'object') for col, kind in kinds.items() if kind in ('float', 'object')}
+
+        # Cleaned chunks go to a temporary file first; compact dtypes need every row of a column
+        uncompacted_path = f"{processed_path}.uncompacted"
+        writer, schema, n_written = None, None, 0
+        try:
+            for chunk in pd.read_csv(raw_path, **RAW_CSV_READ_KWARGS, chunksize=chunksize, dtype=read_dtypes):
+                chunk = clean_frame(chunk, category_levels=category_levels, verbose=writer is None, executor=executor)
+                if writer is None:
+                    schema = _arrow_schema(chunk, kinds) # Chunks are cast to it, so dtypes agree across row groups
+                    writer = pq.ParquetWriter(uncompacted_path, schema)
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+                n_written += len(chunk)
+                print(f"  ...processed {n_written}/{n_rows} rows")
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is not None:
+            try:
+                _compact_parquet_file(uncompacted_path, processed_path, manifest)
+            finally:
+                os.remove(uncompacted_path)
+
+        print(f"Preprocessing finished. Final shape: ({n_written}, {len(schema) if schema else 0})")
+        print(f"Processed data saved to {processed_path}")
+
+    except Exception as e:
+        print(f"Error during preprocessing: {e}", file=sys.stderr)
+        raise # Reraise the exception to stop if preprocessing fails
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+# --- Incremental preprocessing ---
+# The processed file carries a manifest (in its Parquet metadata) with a fingerprint of the raw CSV
+# and of every column family's cleaning rules. A rerun compares against it and does the least work:
+# nothing, clean only the appended rows, or rebuild only the columns of families whose rules changed.
+
+MANIFEST_KEY = b'preprocessing_manifest'
+_RULE_CONSTANT_TYPES = (str, int, float, bool, tuple, list, dict)
+
+def _referenced_globals(code):
+    """Global names used by a code object, including its nested functions/comprehensions."""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _referenced_globals(const)
+    return names
+
+def _rules_fingerprint(*funcs):
+    """Hash of the source of `funcs`, the module functions they call and the rule constants they read."""
+    parts, seen, stack = {}, set(), list(funcs)
+    while stack:
+        func = stack.pop()
+        if func.__name__ in seen:
+            continue
+        seen.add(func.__name__)
+        parts[func.__name__] = inspect.getsource(func)
+        for name in _referenced_globals(func.__code__):
+            value = globals().get(name)
+            if inspect.isfunction(value) and value.__module__ == func.__module__:
+                stack.append(value)
+            elif isinstance(value, _RULE_CONSTANT_TYPES):
+                parts[name] = repr(value)
+    return hashlib.sha1(json.dumps(parts, sort_keys=True).encode()).hexdigest()[:16]
+
+def family_fingerprints():
+    """Rules fingerprint of every column family: its codec's rules plus its schema entry (patterns and options)."""
+    return {name: _rules_fingerprint(CODECS[codec]) + hashlib.sha1(repr((codec, patterns, options)).encode()).hexdigest()[:16]
+            for name, codec, patterns, options in COLUMN_SCHEMA}
+
+def _global_fingerprint():
+    """Settings that affect every column: CSV parsing, the family layout, the pandas version and dtype compaction."""
+    settings = (RAW_CSV_READ_KWARGS, FAMILY_NAMES, pd.__version__, _rules_fingerprint(compact_plan))
+    return hashlib.sha1(repr(settings).encode()).hexdigest()[:16]
+
+def _raw_fingerprint(raw_path, prefix_size=None):
+    """
+    Content hash of the raw CSV in one read; also hashes its first `prefix_size` bytes, so an
+    append-only change can be recognised by comparing with the previous full hash.
+    """
+    digest, prefix, prefix_last_byte, size = hashlib.sha1(), None, b'', 0
+    with open(raw_path, 'rb') as f:
+        if prefix_size is not None:
+            remaining = prefix_size
+            while remaining > 0 and (block := f.read(min(1 << 20, remaining))):
+                digest.update(block)
+                size, remaining, prefix_last_byte = size + len(block), remaining - len(block), block[-1:]
+            prefix = digest.hexdigest() if remaining == 0 else None
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+            size += len(block)
+    return {'size': size, 'sha1': digest.hexdigest(), 'prefix_sha1': prefix, 'prefix_ends_line': prefix_last_byte == b'\n'}
+
+def _family_outputs(raw_kinds):
+    """Processed columns produced by each family (its own raw columns plus derived ones), from an empty frame."""
+    empty = pd.DataFrame({col: pd.Series(dtype={'bool': 'bool', 'int': 'int64', 'float': 'float64'}.get(kind, object))
+                          for col, kind in raw_kinds.items()})
+    outputs = {}
+    for name in FAMILY_NAMES:
+        part = empty[family_columns(name, empty.columns)].copy()
+        clean_family(part, name, list(part.columns), None, False)
+        outputs[name] = list(part.columns)
+    return outputs
+
+def build_manifest(raw_path, raw_kinds, n_rows, raw=None):
+    """Manifest stored with the processed file (see `preprocess_incremental`)."""
+    raw = raw or _raw_fingerprint(raw_path)
+    return {
+        'raw': {'size': raw['size'], 'sha1': raw['sha1']},
+        'raw_kinds': raw_kinds, # Unified pandas dtype kind of every raw column, in file order
+        'n_rows': n_rows,
+        'global': _global_fingerprint(),
+        'families': family_fingerprints(),
+        'family_outputs': _family_outputs(raw_kinds),
+    }
+
+def _with_manifest(schema, manifest):
+    return schema.with_metadata({**(schema.metadata or {}), MANIFEST_KEY: json.dumps(manifest).encode()})
+
+def write_processed(df, processed_path, manifest):
+    """Writes the processed frame (as `df.to_parquet(index=False)` would) with its manifest."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_table(table.replace_schema_metadata(_with_manifest(table.schema, manifest).metadata), processed_path)
+
+def read_manifest(processed_path):
+    """The manifest of an existing processed file, or None (missing file, or written before manifests)."""
+    import pyarrow.parquet as pq
+    try:
+        metadata = pq.read_schema(processed_path).metadata or {}
+    except (FileNotFoundError, OSError):
+        return None
+    return json.loads(metadata[MANIFEST_KEY]) if MANIFEST_KEY in metadata else None
+
+def _append_rows(raw_path, processed_path, manifest, raw, executor):
+    """Cleans only the rows appended since the last run and merges them into the processed file. False if not possible."""
+    raw_kinds = manifest['raw_kinds']
+    with open(raw_path, 'rb') as f:
+        f.seek(manifest['raw']['size'])
+        tail = f.read()
+    read_tail = lambda **kwargs: pd.read_csv(io.BytesIO(tail), header=None, names=list(raw_kinds), **RAW_CSV_READ_KWARGS, low_memory=False, **kwargs)
+    new_rows = read_tail()
+    if any(_merge_raw_kind(kind, new_rows[col].dtype) != kind for col, kind in raw_kinds.items()):
+        print("Appended rows change the type of some raw columns.")
+        return False
+    # Parse the new rows exactly as a whole-file read would (see preprocess_data_streaming)
+    new_rows = read_tail(dtype={col: ('float64' if kind == 'float' else 'object') for col, kind in raw_kinds.items() if kind in ('float', 'object')})
+    print(f"Processing {len(new_rows)} appended rows...")
+
+    df = pd.read_parquet(processed_path)
+    category_levels = {col: sorted(set(df[col].cat.categories) | set(new_rows[col].dropna().unique()))
+                       for col in CATEGORICAL_DEMOGRAPHICS if col in df.columns}
+    new_rows = clean_frame(new_rows, category_levels=category_levels, verbose=False, executor=executor)
+    for col, levels in category_levels.items():
+        df[col] = pd.Categorical(df[col], categories=levels)
+    # Undo the stored compact dtypes, so every merged column is compacted afresh (as in a full run)
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype) and col not in category_levels:
+            df[col] = df[col].astype(df[col].cat.categories.dtype)
+        elif pd.api.types.is_integer_dtype(df[col].dtype) and pd.api.types.is_float_dtype(new_rows[col].dtype):
+            df[col] = df[col].astype(new_rows[col].dtype)
+    # Raw text columns were parsed as object above; give them the processed file's string dtype back
+    new_rows = new_rows[df.columns].astype({col: df[col].dtype for col in df.columns if _is_text_dtype(df[col])})
+    df = pd.concat([df, new_rows], ignore_index=True)
+    write_processed(compact_frame(df), processed_path, build_manifest(raw_path, raw_kinds, len(df), raw))
+    return True
+
+def _rebuild_families(raw_path, processed_path, manifest, raw, changed, executor):
+    """Re-cleans only the raw columns of the `changed` families and swaps their outputs into the processed file."""
+    raw_kinds = manifest['raw_kinds']
+    affected = set().union(*(family_columns(name, list(raw_kinds)) for name in changed))
+    affected = [col for col in raw_kinds if col in affected]
+    print(f"Rebuilding {len(affected)} columns of changed column families: {', '.join(changed)}")
+
+    df = pd.read_parquet(processed_path)
+    rebuilt = pd.read_csv(raw_path, usecols=affected, **RAW_CSV_READ_KWARGS, low_memory=False) if affected else pd.DataFrame(index=df.index)
+    if len(rebuilt) != len(df):
+        print("Raw and processed row counts disagree.")
+        return False
+    rebuilt = clean_frame(rebuilt, verbose=False, executor=executor)
+    rebuilt.index = df.index
+
+    # Same column order as a full run: raw columns in file order, then derived columns in family order
+    outputs = _family_outputs(raw_kinds)
+    columns = {col: (rebuilt[col] if col in affected else df[col]) for col in raw_kinds}
+    for name in FAMILY_NAMES:
+        source = rebuilt if name in changed else df
+        columns.update({col: source[col] for col in outputs[name] if col not in raw_kinds})
+    write_processed(compact_frame(pd.DataFrame(columns)), processed_path, build_manifest(raw_path, raw_kinds, len(df), raw))
+    return True
+
+def preprocess_incremental(raw_path, processed_path, chunksize=None, workers=1):
+    """
+    Brings the processed file up to date with the raw CSV and the current cleaning rules, doing as little
+    work as possible. Returns 'unchanged', 'appended', 'families' or 'full' (what was done).
+    Appending rows and rebuilding families hold the whole processed file in memory, so with `chunksize`
+    (bounded memory) any change reruns the streaming preprocessing instead.
+    """
+    manifest = read_manifest(processed_path)
+    if manifest is None or manifest['global'] != _global_fingerprint() or set(manifest['families']) != set(family_fingerprints()):
+        print("No usable preprocessing manifest; running a full preprocessing.")
+        preprocess_data(raw_path, processed_path, chunksize=chunksize, workers=workers)
+        return 'full'
+
+    raw = _raw_fingerprint(raw_path, prefix_size=manifest['raw']['size'])
+    raw_unchanged = raw['sha1'] == manifest['raw']['sha1']
+    appended = (not raw_unchanged and raw['prefix_sha1'] == manifest['raw']['sha1'] and raw['prefix_ends_line'])
+    changed = [name for name, fingerprint in family_fingerprints().items() if fingerprint != manifest['families'][name]]
+
+    if raw_unchanged and not changed:
+        print(f"{processed_path} is up to date with {raw_path} and the cleaning rules; nothing to do.")
+        return 'unchanged'
+    if chunksize:
+        print("Raw data or cleaning rules changed; rerunning the bounded-memory (streaming) preprocessing.")
+        preprocess_data(raw_path, processed_path, chunksize=chunksize, workers=workers)
+        return 'full'
+    executor = make_executor(workers)
+    try:
+        if raw_unchanged and _rebuild_families(raw_path, processed_path, manifest, raw, changed, executor):
+            return 'families'
+        if appended and not changed and _append_rows(raw_path, processed_path, manifest, raw, executor):
+            return 'appended'
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    print("Raw data or cleaning rules changed; running a full preprocessing.")
+    preprocess_data(raw_path, processed_path, chunksize=chunksize, workers=workers)
+    return 'full'
+
+def build_aggregate_cube(processed_path, cube_path, force=False):
+    """
+    Precomputes the Demographics-page aggregates into a sidecar Parquet cube (see src/cube.py).
+    Skipped when the existing cube was built from the current processed file by the current analysis code, unless `force`.
+    """
+    if config.PROJECT_ROOT not in sys.path: # src.* modules are imported as a package
+        sys.path.insert(0, config.PROJECT_ROOT)
+    from src.cube import cube_is_current, write_aggregate_cube
+    from src.versioning import dataset_version
+    if not force and cube_is_current(cube_path, dataset_version(processed_path)):
+        print(f"Aggregate cube {cube_path} is up to date; nothing to do.")
+        return
+    write_aggregate_cube(processed_path, cube_path)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean the raw GPS CSV into the processed Parquet file.")
+    parser.add_argument("--chunksize", type=int, default=config.PREPROCESSING_CHUNKSIZE,
+                        help="Stream the CSV in chunks of this many rows (bounded memory; changes then rerun the full stream)")
+    parser.add_argument("--workers", type=int, default=config.PREPROCESSING_WORKERS,
+                        help="Processes for cleaning column families in parallel (1 = serial, 0 = all cores)")
+    parser.add_argument("--full", action="store_true",
+                        help="Reprocess everything instead of only what changed since the last run")
+    parser.add_argument("--verify-numeric-parser", action="store_true",
+                        help="Check the vectorized times-used parser against clean_value and exit")
+    parser.add_argument("--verify-multi-select-decoder", action="store_true",
+                        help="Check the checkbox decoder on known answers and exit")
+    args = parser.parse_args()
+    if args.verify_numeric_parser:
+        sys.exit(0 if verify_numeric_parser(config.RAW_DATA_PATH) else 1)
+    if args.verify_multi_select_decoder:
+        sys.exit(0 if verify_multi_select_decoder() else 1)
+
     # Ensure paths are correct relative to where you run this script, or use absolute paths
     # Assumes config.py is in the same directory (src/)
-    preprocess_data(config.RAW_DATA_PATH, config.PROCESSED_DATA_PATH)
\ No newline at end of file
+    if args.full:
+        preprocess_data(config.RAW_DATA_PATH, config.PROCESSED_DATA_PATH, chunksize=args.chunksize, workers=args.workers)
+    else:
+        preprocess_incremental(config.RAW_DATA_PATH, config.PROCESSED_DATA_PATH, chunksize=args.chunksize, workers=args.workers)
+    build_aggregate_cube(config.PROCESSED_DATA_PATH, config.AGGREGATE_CUBE_PATH, force=args.full)
\ No newline at end of file
@@ -0,0 +1,213 @@
+# src/report.py
+# Headless batch report: every (reference, comparison, variable) combination of the Demographics
+# page rendered to static files without Streamlit -- the page's chart as Vega-Lite JSON (and SVG/PNG
+# rendered offline by vl-convert), its summary table as CSV and its significance test as text.
+# Combinations are rendered on a process pool. A manifest keeps a fingerprint of each combination's
+# inputs (its comparison frame, the rendering code and the report options), so a rerun only renders
+# the combinations whose inputs changed.
+#
+# SVG/PNG output needs the optional vl-convert-python package, which requirements.txt does not
+# install (`pip install vl-convert-python`); JSON, CSV and text output work without it.
+#
+#   python -m src.report --output reports/demographics --formats json svg png
+import argparse
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from src import config # Use 'from src import config'
+from src import plotting
+from src.analysis import calculate_summary_stats, grouped_stats, perform_comparison_tests
+from src.groups import GroupIndex, build_comparison_frame, group_display_labels
+
+FORMATS = ('json', 'svg', 'png')
+MANIFEST_NAME = 'report_manifest.json'
+INDEX_NAME = 'report_index.csv'
+GROUP_COL = 'group_for_plot'
+RENDERING_SOURCES = ('analysis.py', 'config.py', 'groups.py', 'pairwise_tests.py', 'plotting.py', 'report.py') # Edits re-render everything
+
+
+def _slug(name):
+    """File-system safe version of a substance or group name."""
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', name).strip('_')
+
+def _code_fingerprint():
+    """Hash of the modules that produce the report's contents."""
+    digest = hashlib.sha1()
+    for file_name in RENDERING_SOURCES:
+        with open(os.path.join(config.PROJECT_ROOT, 'src', file_name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def _frame_fingerprint(df_pair, base_fingerprint):
+    """Fingerprint of one combination's inputs: its comparison frame plus the code/options fingerprint."""
+    digest = hashlib.sha1(base_fingerprint.encode())
+    digest.update(pd.util.hash_pandas_object(df_pair, index=False).to_numpy().tobytes())
+    digest.update(','.join(f"{col}:{dtype}" for col, dtype in df_pair.dtypes.items()).encode())
+    return digest.hexdigest()
+
+def _read_report_frame(processed_path, variables):
+    """The substance flags and `variables` columns of the processed file (missing columns left out)."""
+    columns = list(config.FULL_SUBSTANCE_COL_NAMES.values()) + list(variables)
+    available = set(pq.read_schema(processed_path).names)
+    return pd.read_parquet(processed_path, columns=[col for col in columns if col in available])
+
+def _write_atomic(path, data):
+    """Writes bytes to `path` via a temporary file, so an interrupted run never leaves a partial output."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+# --- Rendering (runs in the worker processes) ---
+
+def render_combination(task):
+    """
+    Renders one combination to `<base_path>.vl.json/.svg/.png`, `.stats.csv` and `.test.txt`.
+    Returns the combination's index row (status, group sizes, p-value, render seconds).
+    """
+    start = time.perf_counter()
+    key, df_pair, ref_label, comp_label, col_type, options = task
+    col_name = key['variable']
+    row = {**key, 'n_ref': int((df_pair[GROUP_COL] == ref_label).sum()), 'n_comp': int((df_pair[GROUP_COL] == comp_label).sum())}
+    if row['n_ref'] == 0 or row['n_comp'] == 0:
+        return {**row, 'status': 'insufficient', 'p_value': None, 'seconds': time.perf_counter() - start}
+
+    base_path = os.path.join(options['output'], key['path'])
+    os.makedirs(os.path.dirname(base_path), exist_ok=True)
+    grouped = grouped_stats(df_pair, col_name, GROUP_COL) # Shared by the summary table and the box plot
+    stats_dict = calculate_summary_stats(df_pair, col_name, GROUP_COL, grouped)
+    _write_atomic(f"{base_path}.stats.csv", stats_dict['dataframe'].to_csv(index=col_type != 'numerical').encode('utf-8'))
+    test_text, p_value = perform_comparison_tests(df_pair, col_name, ref_label, comp_label, GROUP_COL)
+    _write_atomic(f"{base_path}.test.txt", (test_text + '\n').encode('utf-8'))
+
+    # Same chart as the Demographics page shows for this variable
+    palette = config.PALETTES[options['palette']]
+    if col_type == 'numerical':
+        chart = plotting.plot_density_boxplot(df_pair, col_name, ref_label, comp_label, GROUP_COL, palette,
+                                              boxplot_stats=grouped.boxplot_frame(GROUP_COL))
+    else:
+        chart = plotting.plot_faceted_pie_charts(df_pair, col_name, ref_label, comp_label, GROUP_COL, palette)
+    spec = chart.to_dict()
+    if 'json' in options['formats']:
+        _write_atomic(f"{base_path}.vl.json", json.dumps(spec).encode('utf-8'))
+    if 'svg' in options['formats'] or 'png' in options['formats']:
+        import vl_convert # Optional dependency, checked up front by `main`
+        if 'svg' in options['formats']:
+            _write_atomic(f"{base_path}.svg", vl_convert.vegalite_to_svg(spec).encode('utf-8'))
+        if 'png' in options['formats']:
+            _write_atomic(f"{base_path}.png", vl_convert.vegalite_to_png(spec, scale=options['png_scale']))
+    return {**row, 'status': 'rendered', 'p_value': p_value, 'seconds': time.perf_counter() - start}
+
+
+# --- Batch ---
+
+def report_tasks(df, options, substances=None, variables=None):
+    """
+    Yields (fingerprint, task) for every combination: comparison frames are built here, once, from
+    the packed group masks, and fingerprinted before any rendering work is scheduled.
+    """
+    substances = substances or config.SUBSTANCE_NAMES_SORTED
+    variables = variables or [col_name for col_name, _col_type in config.DEMOGRAPHIC_COLS.values()]
+    col_types = {col_name: col_type for col_name, col_type in config.DEMOGRAPHIC_COLS.values()}
+    base_fingerprint = _code_fingerprint() + json.dumps({k: v for k, v in options.items() if k != 'output'}, sort_keys=True)
+    group_index = GroupIndex.from_frame(df)
+    mutually_exclusive = options['mutually_exclusive']
+    for reference in substances:
+        if reference not in group_index:
+            continue
+        comparisons = [config.ALL_OTHER_RESPONDENTS] + [s for s in config.SUBSTANCE_NAMES_SORTED if s != reference and s in group_index]
+        for comparison in comparisons:
+            selection = group_index.select(reference, comparison, mutually_exclusive)
+            ref_label, comp_label = group_display_labels(reference, comparison, mutually_exclusive)
+            for col_name in variables:
+                if col_name not in df.columns:
+                    continue
+                df_pair = build_comparison_frame(df, selection, [col_name], ref_label, comp_label, GROUP_COL)
+                key = {'reference': reference, 'comparison': comparison, 'mutually_exclusive': mutually_exclusive,
+                       'variable': col_name, 'path': os.path.join(_slug(reference), _slug(comparison), col_name)}
+                yield _frame_fingerprint(df_pair, base_fingerprint), (key, df_pair, ref_label, comp_label, col_types.get(col_name, 'categorical'), options)
+
+def _load_manifest(output):
+    try:
+        with open(os.path.join(output, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def build_report(processed_path, output, formats=('json',), workers=0, palette=config.DEFAULT_PALETTE_NAME,
+                 mutually_exclusive=True, png_scale=2, substances=None, variables=None, force=False):
+    """
+    Renders the report into `output` (`workers=0` uses every core) and returns its index frame.
+    Combinations whose fingerprint matches the manifest are skipped unless `force`.
+    """
+    variables = variables or [col_name for col_name, _col_type in config.DEMOGRAPHIC_COLS.values()]
+    options = {'output': output, 'formats': sorted(formats), 'palette': palette,
+               'mutually_exclusive': mutually_exclusive, 'png_scale': png_scale}
+    os.makedirs(output, exist_ok=True)
+    manifest = _load_manifest(output)
+    df = _read_report_frame(processed_path, variables)
+
+    start = time.perf_counter()
+    entries, pending, skipped = dict(manifest), [], 0 # Combinations outside this run keep their entries
+    for fingerprint, task in report_tasks(df, options, substances, variables):
+        previous = manifest.get(task[0]['path'])
+        if not force and previous is not None and previous['fingerprint'] == fingerprint:
+            skipped += 1
+        else:
+            pending.append((fingerprint, task))
+    print(f"{skipped + len(pending)} combinations: {len(pending)} to render, {skipped} unchanged")
+
+    workers = workers or os.cpu_count() or 1
+    tasks = [task for _fingerprint, task in pending]
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(min(workers, len(tasks))) as executor:
+            rows = list(executor.map(render_combination, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+    else:
+        rows = [render_combination(task) for task in tasks]
+    for (fingerprint, task), row in zip(pending, rows):
+        entries[task[0]['path']] = {**row, 'fingerprint': fingerprint}
+
+    _write_atomic(os.path.join(output, MANIFEST_NAME), json.dumps(entries, indent=1, sort_keys=True, default=str).encode('utf-8'))
+    index = pd.DataFrame(list(entries.values())).drop(columns=['fingerprint']).sort_values(['reference', 'comparison', 'variable'])
+    index.to_csv(os.path.join(output, INDEX_NAME), index=False)
+    print(f"Rendered {len(pending)} combinations ({skipped} skipped) with {workers} worker(s) in {time.perf_counter() - start:.1f}s -> {output}")
+    return index
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render every Demographics comparison to static files (no Streamlit).")
+    parser.add_argument("--output", default=os.path.join(config.PROJECT_ROOT, 'reports', 'demographics'), help="Report directory")
+    parser.add_argument("--processed-path", default=config.PROCESSED_DATA_PATH, help="Processed Parquet file")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=['json'], help="Chart formats (svg/png need vl-convert-python)")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes (0 = all cores, 1 = no pool)")
+    parser.add_argument("--palette", choices=list(config.PALETTES), default=config.DEFAULT_PALETTE_NAME)
+    parser.add_argument("--png-scale", type=float, default=2, help="PNG resolution multiplier")
+    parser.add_argument("--references", nargs="*", help="Reference substances (default: all)")
+    parser.add_argument("--variables", nargs="*", help="Column names (default: demographic variables)")
+    parser.add_argument("--no-mutually-exclusive", action="store_true", help="Keep reference users in comparison groups")
+    parser.add_argument("--force", action="store_true", help="Re-render unchanged combinations too")
+    args = parser.parse_args(argv)
+
+    if {'svg', 'png'} & set(args.formats):
+        try:
+            import vl_convert # noqa: F401
+        except ImportError:
+            parser.error("SVG/PNG output needs vl-convert-python (pip install vl-convert-python)")
+    build_report(args.processed_path, args.output, args.formats, workers=args.workers, palette=args.palette,
+                 mutually_exclusive=not args.no_mutually_exclusive, png_scale=args.png_scale,
+                 substances=args.references, variables=args.variables, force=args.force)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# src/shared_data.py
+# Read-only shared dataset: the processed Parquet file is exported once per dataset version to an
+# uncompressed Arrow IPC file, which every server process memory-maps. Arrow buffers are then views
+# of the OS page cache, so all processes on a host share one physical copy of the file; numeric and
+# boolean columns without NAs convert to pandas without copying. Frames handed to callers are
+# shallow copy-on-write copies, so a page can never modify the data another session sees.
+import glob
+import os
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from src import config # Use 'from src import config'
+
+if int(pd.__version__.split('.')[0]) < 3: # Always on from pandas 3; shared frames rely on it
+    pd.set_option('mode.copy_on_write', True)
+
+
+def arrow_path(version, shared_dir=None):
+    """IPC file holding dataset `version` (see `versioning.dataset_version`)."""
+    return os.path.join(shared_dir or config.SHARED_DATASET_DIR, f"processed_data.{version}.arrow")
+
+def export_arrow(processed_path, path):
+    """
+    Writes the processed Parquet file as an uncompressed Arrow IPC file at `path`. The file is written
+    under a temporary name and renamed into place, so processes racing to export never see a partial file.
+    """
+    table = pq.read_table(processed_path).unify_dictionaries() # One dictionary per categorical column
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.arrow.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as sink, ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.chmod(tmp_path, 0o644) # Readable by server processes running as other users
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def remove_stale_exports(version, shared_dir=None):
+    """Deletes exports of other dataset versions (processes still mapping them keep their pages)."""
+    current = arrow_path(version, shared_dir)
+    for path in glob.glob(arrow_path('*', shared_dir)):
+        if path != current:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def map_dataset(processed_path, version, shared_dir=None):
+    """The dataset as an Arrow table memory-mapped from its IPC export (exported first if missing)."""
+    path = arrow_path(version, shared_dir)
+    if not os.path.exists(path):
+        export_arrow(processed_path, path)
+        remove_stale_exports(version, shared_dir)
+    return ipc.open_file(pa.memory_map(path)).read_all()
+
+def table_to_frame(table, columns=None):
+    """pandas frame of `columns` (all if None, unknown names skipped), reusing Arrow buffers where possible."""
+    if columns is not None:
+        known = set(table.column_names)
+        table = table.select([col for col in dict.fromkeys(columns) if col in known])
+    return table.to_pandas(split_blocks=True) # One block per column: no consolidation copy
+
+def read_only_view(df):
+    """A copy-on-write view of shared `df`: writes through it copy first and never reach `df`."""
+    return df.copy(deep=False)
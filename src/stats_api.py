@@ -0,0 +1,240 @@
+# src/stats_api.py
+# Read-only HTTP/JSON API for the numbers behind the Demographics page: the summary statistics and
+# significance test of a (reference, comparison, variable) query. A ThreadingHTTPServer (one thread
+# per connection) loads the dataset once per dataset version -- the same memory-mapped export the
+# Streamlit servers share -- and keeps encoded responses in a bounded LRU keyed by query and dataset
+# version. That key is also the response's ETag, so clients can revalidate with If-None-Match.
+#
+#   python -m src.stats_api --port 8765
+#   curl 'http://127.0.0.1:8765/stats?reference=Ibogaine&comparison=Psilocybin&variable=Age'
+import argparse
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pyarrow.parquet as pq
+
+from src import config # Use 'from src import config'
+from src import shared_data
+from src.analysis import calculate_summary_stats, grouped_stats, perform_comparison_tests
+from src.cube import AggregateCube
+from src.groups import GroupIndex, build_comparison_frame, group_display_labels
+from src.memo import SelectionMemo
+from src.versioning import dataset_version
+
+GROUP_COL = 'group_for_plot'
+QUERY_ENDPOINTS = ('/stats', '/summary', '/test')
+
+
+class QueryError(ValueError):
+    """A query the API cannot answer (unknown group or variable, malformed flag); sent as a 400."""
+
+
+class StatsService:
+    """
+    The dataset, group index and aggregate cube of the current dataset version (reloaded when the
+    processed file changes), plus the response cache. Safe to share between request threads.
+    """
+
+    def __init__(self, processed_path=None, cache_size=config.STATS_API_CACHE_SIZE):
+        self.processed_path = processed_path or config.PROCESSED_DATA_PATH
+        self.cache = SelectionMemo(cache_size)
+        self._state = None # (version, df, group_index, aggregate_cube)
+        self._lock = threading.Lock()
+
+    def version(self):
+        version = dataset_version(self.processed_path)
+        if version is None:
+            raise FileNotFoundError(self.processed_path)
+        return version
+
+    def state(self, version):
+        """(df, group_index, aggregate_cube) for dataset `version`, loaded by the first request that needs it."""
+        state = self._state
+        if state is None or state[0] != version:
+            with self._lock:
+                if self._state is None or self._state[0] != version:
+                    self._state = (version, *self._load(version))
+                state = self._state
+        return state[1:]
+
+    def _load(self, version):
+        columns = list(config.FULL_SUBSTANCE_COL_NAMES.values()) + [col for col, _col_type in config.DEMOGRAPHIC_COLS.values()]
+        if config.SHARED_DATASET:
+            df = shared_data.table_to_frame(shared_data.map_dataset(self.processed_path, version), columns)
+        else:
+            df = shared_data.table_to_frame(pq.read_table(self.processed_path), columns)
+        aggregate_cube = AggregateCube.read(config.AGGREGATE_CUBE_PATH, expected_version=version)
+        print(f"Stats API loaded dataset {version} ({len(df)} rows, cube {'found' if aggregate_cube else 'not used'})")
+        return df, GroupIndex.from_frame(df), aggregate_cube
+
+    # --- Queries ---
+
+    def resolve(self, params):
+        """Validated (reference, comparison, mutually_exclusive, col_name, col_type) from query parameters."""
+        def param(name, default=None):
+            value = params.get(name, [default])[0]
+            if value is None:
+                raise QueryError(f"Missing query parameter '{name}'")
+            return value
+        reference = param('reference')
+        comparison = param('comparison', config.ALL_OTHER_RESPONDENTS)
+        variable = param('variable')
+        flag = param('mutually_exclusive', 'true').lower()
+        if flag not in ('true', 'false', '1', '0'):
+            raise QueryError("'mutually_exclusive' must be true or false")
+        if reference not in config.SUBSTANCE_NAME_MAP:
+            raise QueryError(f"Unknown reference group '{reference}'")
+        if comparison != config.ALL_OTHER_RESPONDENTS and (comparison not in config.SUBSTANCE_NAME_MAP or comparison == reference):
+            raise QueryError(f"Unknown comparison group '{comparison}'")
+        columns = {**{col: (col, col_type) for col, col_type in config.DEMOGRAPHIC_COLS.values()}, **config.DEMOGRAPHIC_COLS}
+        if variable not in columns: # A label from the page ("Age") or the column name ("q2_age")
+            raise QueryError(f"Unknown variable '{variable}'")
+        col_name, col_type = columns[variable]
+        return reference, comparison, flag in ('true', '1'), col_name, col_type
+
+    def respond(self, endpoint, params, if_none_match=None):
+        """(status, body bytes or None, etag, cache state) for a query endpoint; 304 when `if_none_match` is current."""
+        query = self.resolve(params)
+        version = self.version()
+        etag = '"' + hashlib.sha1(repr((endpoint, query, version)).encode()).hexdigest()[:20] + '"'
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+            return 304, None, etag, 'revalidated'
+        computed = []
+        def compute():
+            computed.append(True)
+            return json.dumps(self._payload(endpoint, query, version)).encode('utf-8')
+        body = self.cache.get('response', (endpoint, query, version), compute)
+        return 200, body, etag, 'miss' if computed else 'hit'
+
+    def _payload(self, endpoint, query, version):
+        reference, comparison, mutually_exclusive, col_name, col_type = query
+        df, group_index, aggregate_cube = self.state(version)
+        ref_label, comp_label = group_display_labels(reference, comparison, mutually_exclusive)
+        if reference not in group_index or (comparison != config.ALL_OTHER_RESPONDENTS and comparison not in group_index):
+            raise QueryError("Group columns missing from the dataset")
+        selection = group_index.select(reference, comparison, mutually_exclusive)
+        payload = {
+            'dataset_version': version,
+            'query': {'reference': reference, 'comparison': comparison, 'mutually_exclusive': mutually_exclusive, 'variable': col_name},
+            'groups': {'reference': {'label': ref_label, 'n': selection.n_ref}, 'comparison': {'label': comp_label, 'n': selection.n_comp}},
+        }
+
+        # Same sources as the page: the aggregate cube when current, else one live pass over the pair frame
+        cube_key = (reference, comparison, mutually_exclusive, col_name)
+        stats_dict = aggregate_cube.summary_stats(*cube_key, col_type) if aggregate_cube else None
+        test = aggregate_cube.comparison_test(*cube_key) if aggregate_cube else None
+        if (stats_dict is None and endpoint != '/test') or (test is None and endpoint != '/summary'):
+            df_pair = build_comparison_frame(df, selection, [col_name], ref_label, comp_label, GROUP_COL)
+            group_counts = df_pair[GROUP_COL].value_counts()
+            if group_counts.get(ref_label, 0) == 0 or group_counts.get(comp_label, 0) == 0:
+                return {**payload, 'insufficient_data': True}
+            if stats_dict is None and endpoint != '/test':
+                stats_dict = calculate_summary_stats(df_pair, col_name, GROUP_COL, grouped_stats(df_pair, col_name, GROUP_COL))
+            if test is None and endpoint != '/summary':
+                test = perform_comparison_tests(df_pair, col_name, ref_label, comp_label, GROUP_COL)
+
+        payload['insufficient_data'] = False
+        if endpoint != '/test':
+            table = stats_dict['dataframe']
+            table = table.reset_index() if stats_dict['type'] == 'categorical' else table
+            payload['summary'] = {'type': stats_dict['type'], 'title': stats_dict['title'],
+                                  'rows': json.loads(table.to_json(orient='records'))} # NaN -> null
+        if endpoint != '/summary':
+            test_text, p_value = test
+            payload['test'] = {'text': test_text, 'p_value': p_value}
+        return payload
+
+    def metadata(self):
+        """Groups, variables and cache counters, for /health and /variables."""
+        return {
+            'dataset_version': dataset_version(self.processed_path),
+            'references': config.SUBSTANCE_NAMES_SORTED,
+            'comparisons': [config.ALL_OTHER_RESPONDENTS] + config.SUBSTANCE_NAMES_SORTED,
+            'variables': {label: {'column': col, 'type': col_type} for label, (col, col_type) in config.DEMOGRAPHIC_COLS.items()},
+            'cache': self.cache.counters().get('response', {'hits': 0, 'misses': 0, 'entries': 0}),
+        }
+
+
+# --- HTTP ---
+
+class StatsRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'GPSStatsAPI/1.0'
+    protocol_version = 'HTTP/1.1' # Keep-alive: clients reuse one connection for many queries
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        service = self.server.service
+        try:
+            if url.path in QUERY_ENDPOINTS:
+                status, body, etag, cache_state = service.respond(url.path, parse_qs(url.query), self.headers.get('If-None-Match'))
+                self._send(status, body, {'ETag': etag, 'Cache-Control': 'no-cache', 'X-Cache': cache_state})
+            elif url.path in ('/health', '/variables'):
+                self._send(200, json.dumps(service.metadata()).encode('utf-8'))
+            else:
+                self._send_error(404, f"Unknown endpoint '{url.path}' (try {', '.join(QUERY_ENDPOINTS)} or /variables)")
+        except QueryError as e:
+            self._send_error(400, str(e))
+        except FileNotFoundError:
+            self._send_error(503, f"Processed data file not found: {service.processed_path}")
+        except Exception as e: # Keep serving; the error goes to the client and the log
+            self.log_error("Error answering %s: %r", self.path, e)
+            self._send_error(500, f"Internal error: {e}")
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if body is not None:
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+        else:
+            self.send_header('Content-Length', '0')
+        self.end_headers()
+        if body is not None:
+            self.wfile.write(body)
+
+    def _send_error(self, status, message):
+        self._send(status, json.dumps({'error': message}).encode('utf-8'))
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class StatsServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer answering with one shared StatsService."""
+    daemon_threads = True
+
+    def __init__(self, address, service=None, verbose=False):
+        super().__init__(address, StatsRequestHandler)
+        self.service = service or StatsService()
+        self.verbose = verbose
+
+def serve_in_thread(host='127.0.0.1', port=0, service=None):
+    """Starts a StatsServer on a background thread (port 0 picks a free one); returns the server."""
+    server = StatsServer((host, port), service)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve summary statistics and significance tests as JSON over HTTP.")
+    parser.add_argument("--host", default=config.STATS_API_HOST)
+    parser.add_argument("--port", type=int, default=config.STATS_API_PORT)
+    parser.add_argument("--processed-path", default=config.PROCESSED_DATA_PATH, help="Processed Parquet file")
+    parser.add_argument("--cache-size", type=int, default=config.STATS_API_CACHE_SIZE, help="Responses kept in memory")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    service = StatsService(args.processed_path, args.cache_size)
+    service.state(service.version()) # Load before accepting requests
+    server = StatsServer((args.host, args.port), service, verbose=args.verbose)
+    print(f"Stats API listening on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
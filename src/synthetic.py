@@ -0,0 +1,137 @@
+# src/synthetic.py
+# Synthetic respondents following the processed GPS schema implied by config.py: the q18 lifetime-use
+# flags and q18a times-used counts, DEMOGRAPHIC_COLS, GAD/PHQ and agreement Likert items, rating
+# columns and other yes/no questions. Used to benchmark the app at many times the real data size.
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from src import config # Use 'from src import config'
+
+BASE_N_ROWS = 6379 # Respondents in the bundled GPS 2023 extract; benchmark scales multiply this
+
+# Lifetime-use prevalence and median times used, roughly as in the GPS 2023 extract
+SUBSTANCE_PREVALENCE = {
+    '2C-B': 0.21, 'Ayahuasca': 0.25, 'DMT/5-MeO-DMT': 0.37, 'Ibogaine': 0.07, 'Ketamine': 0.44, 'LSD': 0.73,
+    'MDMA/MDA': 0.71, 'Mescaline': 0.30, 'Nitrous Oxide': 0.41, 'Psilocybin': 0.91, 'Salvia Divinorum': 0.24,
+    'Other Psychedelic': 0.17,
+}
+MEDIAN_TIMES_USED = {
+    '2C-B': 2, 'Ayahuasca': 3, 'DMT/5-MeO-DMT': 3, 'Ibogaine': 1, 'Ketamine': 5, 'LSD': 8,
+    'MDMA/MDA': 10, 'Mescaline': 2, 'Nitrous Oxide': 5, 'Psilocybin': 10, 'Salvia Divinorum': 2,
+}
+
+CATEGORY_DISTRIBUTIONS = {
+    'q1_gender': {'Male': 0.50, 'Female': 0.467, 'Non-binary': 0.023, 'other': 0.007, 'Prefer not to say': 0.003},
+    'q3_relationship_status': {
+        'Married': 0.358, 'Single, never married': 0.243, 'Divorced/separated': 0.15,
+        'Single, but cohabiting with a significant other': 0.125, 'In a domestic partnership or civil union': 0.101,
+        'Widowed': 0.023,
+    },
+    'q7_current_living_arrangement': {'Urban area': 0.414, 'Suburban area': 0.394, 'Rural or remote area': 0.192},
+    'q8_education_level': {
+        "University degree (Bachelors' degree or equivalent)": 0.336, 'Graduate degree (MA, MSc, etc.)': 0.256,
+        'Technical and non-university degree (college; CEGEP)': 0.137, 'High school degree or equivalent': 0.132,
+        'Doctorate or professional degree (JD, MD, PhD, etc.)': 0.122, 'Less than high school degree': 0.016,
+    },
+    'q10_household_income_category': {
+        'Middle income / about average': 0.443, 'High income / above average': 0.279,
+        'Low income / below average': 0.158, 'Very high income / well above average': 0.069,
+        'Very low income / well below average': 0.051,
+    },
+}
+
+GAD_PHQ_ITEMS = [f"q79{letter}_gad" for letter in 'abcdefg'] + [f"q80{letter}_phq" for letter in 'abcdefghi']
+AGREEMENT_ITEMS = [f"q25{letter}_music" for letter in 'abcdefghijk'] + ['q36_chemically_identical', 'q37_environmental_impact',
+                   'q54_negative_experience_outcome'] + [f"q41{letter}_experience" for letter in 'abcdefg']
+RATING_ITEMS = ['q14_knowledge_ranking', 'q15_experience_ranking', 'q46_positive_experience_rating'] # 0-100
+OTHER_YES_NO_ITEMS = [f"q11_lifetime_substance_use.{name}" for name in ('Alcohol', 'Cannabis', 'Cocaine_crack', 'Tobacco')] + \
+                     [f"q19_psychedelic_setting.{name}" for name in ('Alone', 'Friends', 'Ceremony', 'Festival')]
+
+
+def generate_processed_frame(n_rows=BASE_N_ROWS, seed=0, missing_rate=0.03):
+    """
+    A frame with the dtypes `preprocessing.py` cleans columns into (before `compact_frame`): nullable booleans
+    for yes/no questions, floats for times used and ages, categoricals for demographics and Int64 for Likert items.
+    Answers are drawn independently per column, except that times used are only set for users.
+    """
+    rng = np.random.default_rng(seed)
+
+    def with_missing(values):
+        return values.mask(rng.random(n_rows) < missing_rate)
+
+    data = {}
+    for substance, col_name in config.FULL_SUBSTANCE_COL_NAMES.items():
+        data[col_name] = pd.array(rng.random(n_rows) < SUBSTANCE_PREVALENCE[substance], dtype='boolean')
+    for substance, median in MEDIAN_TIMES_USED.items():
+        is_user = data[config.FULL_SUBSTANCE_COL_NAMES[substance]].to_numpy(dtype=bool)
+        times_used = np.minimum(np.round(rng.lognormal(np.log(median), 1.3, n_rows)), 1000).clip(1)
+        data[f"q18a_psychedelic_times_used.{config.SUBSTANCE_NAME_MAP[substance]}"] = np.where(is_user, times_used, np.nan)
+
+    data['q2_age'] = with_missing(pd.Series(np.round(rng.normal(43, 14, n_rows)).clip(18, 90)))
+    for col_name, distribution in CATEGORY_DISTRIBUTIONS.items():
+        labels = list(distribution)
+        probabilities = np.array(list(distribution.values()))
+        codes = rng.choice(len(labels), size=n_rows, p=probabilities / probabilities.sum())
+        # Sorted categories, as astype('category') in preprocessing produces
+        data[col_name] = with_missing(pd.Series(pd.Categorical(np.array(labels, dtype=object)[codes], categories=sorted(labels))))
+
+    for col_name in RATING_ITEMS:
+        data[col_name] = with_missing(pd.Series(rng.integers(0, 101, n_rows).astype('float64')))
+    for col_name in GAD_PHQ_ITEMS:
+        data[col_name] = with_missing(pd.Series(rng.integers(0, 4, n_rows))).astype('Int64')
+    for col_name in AGREEMENT_ITEMS:
+        data[col_name] = with_missing(pd.Series(rng.integers(1, 6, n_rows))).astype('Int64')
+    for col_name in OTHER_YES_NO_ITEMS:
+        data[col_name] = with_missing(pd.Series(rng.random(n_rows) < 0.5)).astype('boolean')
+    return pd.DataFrame(data)
+
+# Inverse of the preprocessing maps, for generating raw CSV answers
+RAW_GAD_PHQ_ANSWERS = ['Not at all', 'Several days', 'More than half the days', 'Nearly every day']
+RAW_AGREEMENT_ANSWERS = ['Strongly disagree', 'Somewhat disagree', 'Neither agree nor disagree', 'Somewhat agree', 'Strongly agree']
+RAW_TIMES_USED_TOKENS = ['5-10', '>100', '<5', 'n/a', 'unknown', 'Prefer not to say']
+
+def to_raw_frame(df, seed=0, token_rate=0.05):
+    """
+    The answers of a `generate_processed_frame` frame as the raw survey export writes them (Yes/No,
+    Likert labels, free-text times used with occasional ranges and bounds), for preprocessing runs.
+    """
+    rng = np.random.default_rng([seed, 1]) # Independent of the stream that generated `df`
+    raw = {}
+    for col_name in df.columns:
+        series = df[col_name]
+        if isinstance(series.dtype, pd.BooleanDtype):
+            raw[col_name] = series.map({True: 'Yes', False: 'No'}).astype(object)
+        elif col_name in GAD_PHQ_ITEMS:
+            raw[col_name] = series.map(dict(enumerate(RAW_GAD_PHQ_ANSWERS))).astype(object)
+        elif col_name in AGREEMENT_ITEMS:
+            raw[col_name] = series.map(dict(enumerate(RAW_AGREEMENT_ANSWERS, start=1))).astype(object)
+        elif col_name.startswith('q18a_psychedelic_times_used.'):
+            values = series.map(lambda value: f"{value:g}", na_action='ignore').astype(object)
+            has_token = series.notna().to_numpy() & (rng.random(len(series)) < token_rate)
+            values[has_token] = rng.choice(RAW_TIMES_USED_TOKENS, size=has_token.sum())
+            raw[col_name] = values
+        else:
+            raw[col_name] = series.astype(object) if isinstance(series.dtype, pd.CategoricalDtype) else series
+    return pd.DataFrame(raw)
+
+def write_synthetic_dataset(path, n_rows=BASE_N_ROWS, seed=0, raw=False):
+    """Writes a processed Parquet file (or, with `raw`, a raw CSV) of `n_rows` synthetic respondents."""
+    df = generate_processed_frame(n_rows, seed)
+    if raw:
+        to_raw_frame(df, seed).to_csv(path, index=False, encoding='latin1')
+    else:
+        df.to_parquet(path, index=False)
+    return df
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic GPS-schema dataset.")
+    parser.add_argument("output", help="Parquet file to write (CSV with --raw)")
+    parser.add_argument("--scale", type=float, default=1.0, help=f"Multiple of the real respondent count ({BASE_N_ROWS})")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--raw", action="store_true", help="Write raw survey answers as CSV, the input of preprocessing.py")
+    args = parser.parse_args()
+
+    df = write_synthetic_dataset(args.output, int(BASE_N_ROWS * args.scale), args.seed, raw=args.raw)
+    print(f"Wrote {len(df)} synthetic respondents ({df.shape[1]} columns) to {args.output}")
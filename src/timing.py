@@ -0,0 +1,138 @@
+# src/timing.py
+# Lightweight timing spans for a page rerun. A page calls `start_run(...)` at the top and
+# `finish_run()` at the end; code in between marks stages with `span(...)` / `@timed()`. Finished
+# runs are written as one JSON log line (selection + spans) and can be shown in a sidebar panel.
+# While no run is being recorded, `span` returns a shared no-op context and `@timed` functions
+# make one attribute lookup before calling straight through.
+import functools
+import json
+import logging
+import sys
+import threading
+import time
+
+from src import config # Use 'from src import config'
+
+
+class _RunState(threading.local):
+    """Per-thread recording state (Streamlit runs each session's rerun in its own thread)."""
+    spans = None # List of finished spans while a run is recorded, else None
+    depth = 0
+    t0 = 0.0
+    run = None
+
+_local = _RunState()
+_logger = logging.getLogger('gps.timing')
+
+
+class _Span:
+    """Records one timed stage into the current run; extra `fields` can be added while it is open."""
+
+    __slots__ = ('spans', 'name', 'fields', 'start')
+
+    def __init__(self, spans, name, fields):
+        self.spans, self.name, self.fields = spans, name, fields
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        _local.depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        _local.depth -= 1
+        self.spans.append({
+            'name': self.name, 'depth': _local.depth,
+            'start_ms': round((self.start - _local.t0) * 1000, 3),
+            'ms': round((time.perf_counter() - self.start) * 1000, 3),
+            **self.fields,
+        })
+        return False
+
+
+class _NullSpan:
+    """Stand-in for `_Span` when no run is recorded; fields added to it are discarded."""
+
+    __slots__ = ()
+
+    @property
+    def fields(self):
+        return {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+
+def enabled():
+    """True while the current thread is recording a run."""
+    return _local.spans is not None
+
+def span(name, **fields):
+    """Context manager timing the enclosed stage; a no-op unless a run is being recorded."""
+    spans = _local.spans
+    if spans is None:
+        return _NULL_SPAN
+    return _Span(spans, name, fields)
+
+def timed(name=None):
+    """Decorator recording each call of the function as a span (named after the function by default)."""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            spans = _local.spans
+            if spans is None:
+                return func(*args, **kwargs)
+            with _Span(spans, span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def start_run(page, record=None, **selection):
+    """Starts recording a rerun of `page` (if `record`, default `config.TIMING_ENABLED`) with its current selection."""
+    record = config.TIMING_ENABLED if record is None else record
+    _local.spans = [] if record else None
+    _local.depth = 0
+    _local.t0 = time.perf_counter()
+    _local.run = {'page': page, 'selection': selection}
+
+def finish_run():
+    """Stops recording; logs the run as one JSON line and returns it (None if nothing was recorded)."""
+    spans = _local.spans
+    if spans is None:
+        return None
+    _local.spans = None
+    run = {
+        **_local.run, 'time': time.time(), 'total_ms': round((time.perf_counter() - _local.t0) * 1000, 3),
+        'spans': sorted(spans, key=lambda s: s['start_ms']), # Parents close after their children
+    }
+    _log(run)
+    return run
+
+def _log(run):
+    if not _logger.handlers:
+        handler = logging.FileHandler(config.TIMING_LOG_PATH) if config.TIMING_LOG_PATH else logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        _logger.addHandler(handler)
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+    _logger.info(json.dumps(run, default=str))
+
+def render_debug_panel(run, container=None):
+    """Shows a finished run's spans (indented by nesting) in `container` (default: the sidebar)."""
+    import pandas as pd
+    import streamlit as st
+    container = container or st.sidebar
+    with container.expander(f"⏱️ Timing: {run['total_ms']:.0f} ms", expanded=True):
+        table = pd.DataFrame(run['spans'])
+        if table.empty:
+            st.caption("No spans recorded.")
+            return
+        table['stage'] = [('  ' * depth + '↳ ' if depth else '') + name for depth, name in zip(table['depth'], table['name'])]
+        extra = [col for col in table.columns if col not in ('name', 'depth', 'start_ms', 'ms', 'stage')]
+        st.dataframe(table[['stage', 'ms', 'start_ms'] + extra], hide_index=True, use_container_width=True)
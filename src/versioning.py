@@ -0,0 +1,18 @@
+# src/versioning.py
+import hashlib
+import os
+
+from src import config # Use 'from src import config'
+
+
+def file_fingerprint(path):
+    """Cheap fingerprint of a file from its size and modification time (no content read)."""
+    stat = os.stat(path)
+    return hashlib.sha1(f"{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:16]
+
+def dataset_version(path=None):
+    """Version tag of the processed dataset; changes whenever the Parquet file is rewritten."""
+    try:
+        return file_fingerprint(path or config.PROCESSED_DATA_PATH)
+    except FileNotFoundError:
+        return None